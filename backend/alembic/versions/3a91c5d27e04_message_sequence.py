@@ -0,0 +1,95 @@
+"""per-session message sequence
+
+Revision ID: 3a91c5d27e04
+Revises: 0518e2e79961
+Create Date: 2026-10-18 09:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3a91c5d27e04'
+down_revision = '0518e2e79961'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL_BATCH = 1000  # sessions per batch
+
+
+def number_messages(conn, sessions: str, params: dict) -> None:
+    """
+    Give the unnumbered messages of the sessions matched by `sessions` (SQL
+    over chat_sessions aliased c) seqs after the highest one they have, in
+    (created_at, id) order, and move those sessions' last_seq along.
+    """
+    touched = conn.execute(sa.text(f"""
+        WITH numbered AS (
+            SELECT m.id,
+                   coalesce(max(m.seq) OVER (PARTITION BY m.session_id), 0)
+                   + row_number() OVER (PARTITION BY m.session_id, m.seq IS NULL ORDER BY m.created_at, m.id) AS rn,
+                   m.seq IS NULL AS missing
+            FROM messages m JOIN chat_sessions c ON c.id = m.session_id
+            WHERE {sessions}
+        )
+        UPDATE messages SET seq = numbered.rn
+        FROM numbered WHERE messages.id = numbered.id AND numbered.missing
+        RETURNING messages.session_id
+    """), params).scalars().all()
+    if touched:
+        conn.execute(sa.text("""
+            UPDATE chat_sessions AS c
+            SET last_seq = greatest(c.last_seq, (SELECT max(seq) FROM messages m WHERE m.session_id = c.id))
+            WHERE c.id = ANY(CAST(:ids AS uuid[]))
+        """), {"ids": sorted({str(i) for i in touched})})
+
+
+def upgrade():
+    # ---------------------- CHAT SESSIONS ----------------------
+    # last sequence number handed out in the session (a constant default is
+    # a catalog-only change)
+    op.add_column('chat_sessions', sa.Column('last_seq', sa.BigInteger, nullable=False, server_default='0'))
+
+    # ---------------------- MESSAGES ----------------------
+    # nullable first: no table rewrite
+    op.add_column('messages', sa.Column('seq', sa.BigInteger, nullable=True))
+
+    with op.get_context().autocommit_block():
+        # Number existing messages in (created_at, id) order within each
+        # session, a batch of sessions in id order at a time, each committed
+        # on its own so row locks are short and the work is resumable
+        conn = op.get_bind()
+        last = '00000000-0000-0000-0000-000000000000'
+        while True:
+            ids = conn.execute(sa.text(
+                "SELECT id FROM chat_sessions WHERE id > CAST(:last AS uuid) ORDER BY id LIMIT :size"
+            ), {"last": last, "size": BACKFILL_BATCH}).scalars().all()
+            if not ids:
+                break
+            number_messages(conn, "c.id = ANY(CAST(:ids AS uuid[]))", {"ids": [str(i) for i in ids]})
+            last = str(ids[-1])
+
+        # NOT NULL without a full scan under ACCESS EXCLUSIVE: a NOT VALID
+        # check holds for new rows at once, VALIDATE scans under a lock that
+        # lets writes through, and SET NOT NULL then trusts the valid check.
+        # Rows written without a seq while the batches ran are numbered just
+        # before and after the check is added.
+        number_messages(conn, "EXISTS (SELECT 1 FROM messages x WHERE x.session_id = c.id AND x.seq IS NULL)", {})
+        op.execute('ALTER TABLE messages ADD CONSTRAINT messages_seq_not_null CHECK (seq IS NOT NULL) NOT VALID')
+        number_messages(conn, "EXISTS (SELECT 1 FROM messages x WHERE x.session_id = c.id AND x.seq IS NULL)", {})
+        op.execute('ALTER TABLE messages VALIDATE CONSTRAINT messages_seq_not_null')
+        op.alter_column('messages', 'seq', nullable=False)
+        op.execute('ALTER TABLE messages DROP CONSTRAINT messages_seq_not_null')
+
+        # Build the unique index without blocking writes on large tables
+        op.execute(
+            'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_session_seq '
+            'ON messages (session_id, seq)'
+        )
+
+
+def downgrade():
+    op.drop_index('ix_messages_session_seq', table_name='messages')
+    op.drop_column('messages', 'seq')
+    op.drop_column('chat_sessions', 'last_seq')
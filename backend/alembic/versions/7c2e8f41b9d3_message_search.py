@@ -0,0 +1,79 @@
+"""full-text search over messages
+
+Revision ID: 7c2e8f41b9d3
+Revises: 3a91c5d27e04
+Create Date: 2026-10-18 10:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '7c2e8f41b9d3'
+down_revision = '3a91c5d27e04'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 5000
+
+
+def search_vector(row: str) -> str:
+    """Message text weighted above the names of the tools it called."""
+    return (
+        f"setweight(to_tsvector('english', {row}content), 'A') || "
+        f"setweight(to_tsvector('english', coalesce(jsonb_path_query_array({row}tool_calls, '$[*].tool')::text, '')), 'B')"
+    )
+
+
+def upgrade():
+    # ---------------------- MESSAGES ----------------------
+    # A plain nullable column is a catalog-only change: no table rewrite.
+    # (A stored generated column would rewrite every row under an ACCESS
+    # EXCLUSIVE lock.)
+    op.add_column('messages', sa.Column('search_vector', postgresql.TSVECTOR, nullable=True))
+
+    # New and edited rows get their vector from a trigger
+    op.execute(f"""
+        CREATE FUNCTION messages_search_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {search_vector('NEW.')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute(
+        'CREATE TRIGGER messages_search_vector BEFORE INSERT OR UPDATE OF content, tool_calls '
+        'ON messages FOR EACH ROW EXECUTE FUNCTION messages_search_vector()'
+    )
+
+    with op.get_context().autocommit_block():
+        # Existing rows: batches in id order, each committed on its own so
+        # locks are short and the work is resumable
+        conn = op.get_bind()
+        last = '00000000-0000-0000-0000-000000000000'
+        while True:
+            ids = conn.execute(sa.text(f"""
+                WITH batch AS (
+                    SELECT id FROM messages WHERE id > CAST(:last AS uuid) ORDER BY id LIMIT :size
+                )
+                UPDATE messages SET search_vector = {search_vector('messages.')}
+                FROM batch WHERE messages.id = batch.id
+                RETURNING messages.id
+            """), {"last": last, "size": BACKFILL_BATCH}).scalars().all()
+            if not ids:
+                break
+            last = str(max(ids))
+
+        # Build the GIN index without blocking writes on large tables
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_search '
+            'ON messages USING gin (search_vector)'
+        )
+
+
+def downgrade():
+    op.drop_index('ix_messages_search', table_name='messages')
+    op.execute('DROP TRIGGER IF EXISTS messages_search_vector ON messages')
+    op.execute('DROP FUNCTION IF EXISTS messages_search_vector()')
+    op.drop_column('messages', 'search_vector')
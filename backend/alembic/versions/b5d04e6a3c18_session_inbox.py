@@ -0,0 +1,49 @@
+"""denormalized session inbox columns
+
+Revision ID: b5d04e6a3c18
+Revises: 7c2e8f41b9d3
+Create Date: 2026-10-18 11:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b5d04e6a3c18'
+down_revision = '7c2e8f41b9d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ---------------------- CHAT SESSIONS ----------------------
+    op.add_column('chat_sessions', sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('chat_sessions', sa.Column('last_message_preview', sa.String(200), nullable=True))
+    op.add_column(
+        'chat_sessions',
+        sa.Column('last_activity_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+
+    # Latest message (highest seq) of every session
+    op.execute("""
+        UPDATE chat_sessions AS c
+        SET last_message_at = m.created_at,
+            last_message_preview = left(regexp_replace(m.content, '\\s+', ' ', 'g'), 200)
+        FROM messages AS m
+        WHERE m.session_id = c.id AND m.seq = c.last_seq
+    """)
+    op.execute("UPDATE chat_sessions SET last_activity_at = coalesce(last_message_at, created_at)")
+
+    op.create_index('ix_chat_sessions_user_activity', 'chat_sessions', ['user_id', 'last_activity_at'])
+
+    # ---------------------- CHAT SESSION PARTICIPANTS ----------------------
+    # the primary key leads with session_id; inbox lookups go by user
+    op.create_index('ix_chat_session_participants_user', 'chat_session_participants', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_chat_session_participants_user', table_name='chat_session_participants')
+    op.drop_index('ix_chat_sessions_user_activity', table_name='chat_sessions')
+    op.drop_column('chat_sessions', 'last_activity_at')
+    op.drop_column('chat_sessions', 'last_message_preview')
+    op.drop_column('chat_sessions', 'last_message_at')
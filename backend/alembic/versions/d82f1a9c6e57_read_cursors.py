@@ -0,0 +1,41 @@
+"""per-participant read cursors
+
+Revision ID: d82f1a9c6e57
+Revises: b5d04e6a3c18
+Create Date: 2026-10-18 12:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd82f1a9c6e57'
+down_revision = 'b5d04e6a3c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ---------------------- CHAT SESSION PARTICIPANTS ----------------------
+    op.add_column(
+        'chat_session_participants',
+        sa.Column('last_read_seq', sa.BigInteger, nullable=False, server_default='0'),
+    )
+
+    # Owners get a participant row too, so every member has a read cursor
+    op.execute("""
+        INSERT INTO chat_session_participants (session_id, user_id, role)
+        SELECT id, user_id, 'owner' FROM chat_sessions
+        ON CONFLICT (session_id, user_id) DO NOTHING
+    """)
+
+    # Start everyone with nothing unread
+    op.execute("""
+        UPDATE chat_session_participants AS p SET last_read_seq = c.last_seq
+        FROM chat_sessions AS c
+        WHERE c.id = p.session_id
+    """)
+
+
+def downgrade():
+    op.drop_column('chat_session_participants', 'last_read_seq')
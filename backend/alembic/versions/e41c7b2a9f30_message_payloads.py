@@ -0,0 +1,35 @@
+"""out-of-line storage for large tool payloads
+
+Revision ID: e41c7b2a9f30
+Revises: d82f1a9c6e57
+Create Date: 2026-10-18 13:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'e41c7b2a9f30'
+down_revision = 'd82f1a9c6e57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ---------------------- MESSAGE PAYLOADS ----------------------
+    # Existing messages keep their inline payloads; only new ones are moved out.
+    # Payloads belong to a session: lookups are scoped to it and they are
+    # deleted with it (messages are never deleted on their own)
+    op.create_table(
+        'message_payloads',
+        sa.Column('session_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('chat_sessions.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('hash', sa.String(64), primary_key=True),
+        sa.Column('data', postgresql.JSONB, nullable=False),
+        sa.Column('size', sa.Integer, nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('message_payloads')
@@ -0,0 +1,114 @@
+# app/auth/cache.py
+from __future__ import annotations
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import event
+
+from .. import models
+from ..config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    """The authenticated user as seen by routes: a snapshot, not an ORM row."""
+    id: uuid.UUID
+    email: str
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified access tokens to user snapshots, keyed by the
+    token's SHA-256 so raw tokens are not kept in memory. An entry lives
+    for at most `ttl` seconds and never past the token's own `exp`.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        # token hash -> (user, expiry as unix time)
+        self._entries: "OrderedDict[bytes, Tuple[AuthUser, float]]" = OrderedDict()
+        self._by_user: Dict[uuid.UUID, Set[bytes]] = {}
+        self._lock = threading.Lock()  # sync routes run in the threadpool
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, token: str) -> Optional[AuthUser]:
+        if self.max_size <= 0:
+            return None
+        key = _key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    self._remove(key)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, token: str, user: AuthUser, exp: Optional[float]) -> None:
+        """Cache a token verified just now; `exp` is its expiry claim (unix time)."""
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        key = _key(token)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (user, expires_at)
+            self._by_user.setdefault(user.id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def invalidate_user(self, user_id: uuid.UUID) -> None:
+        """Drop every cached token of a user, e.g. after the user changed."""
+        with self._lock:
+            keys = self._by_user.pop(user_id, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            self.stats["invalidations"] += len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def info(self) -> dict:
+        return {**self.stats, "size": len(self._entries)}
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    def _remove(self, key: bytes) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_user.get(entry[0].id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[entry[0].id]
+
+
+def _key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+token_cache = TokenCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS)
+
+
+# Any change to a user row made through the ORM in this process drops the
+# user's cached tokens; other workers catch up within the TTL.
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target: models.User) -> None:
+    token_cache.invalidate_user(target.id)
@@ -1,9 +1,11 @@
+import uuid
 from typing import Optional
 from fastapi import Depends, Header, HTTPException, status
 from jose import JWTError
 from sqlalchemy.orm import Session
-from ..db import get_db
+from ..db import DbSession, get_db, run_db, run_in_session
 from .. import models
+from .cache import AuthUser, token_cache
 from .utils import decode_token
 import logging
 logger = logging.getLogger(__name__)
@@ -13,22 +15,47 @@ def _extract_bearer_token(authorization: Optional[str]) -> str:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     return authorization.split(" ", 1)[1].strip()
 
-def get_current_user(
-    authorization: Optional[str] = Header(default=None, alias="Authorization"),
-    db: Session = Depends(get_db),
-) -> models.User:
-    token = _extract_bearer_token(authorization)
+def _get_user(db: Session, user_id: uuid.UUID, email: str) -> Optional[AuthUser]:
+    row = db.query(models.User.id, models.User.email).filter(
+        models.User.id == user_id, models.User.email == email
+    ).first()
+    return AuthUser(id=row.id, email=row.email) if row else None
+
+async def authenticate(token: str, db: Optional[DbSession] = None) -> AuthUser:
+    """
+    Resolve an access token to its user. Verified tokens are cached, so a
+    repeat request skips both the signature check and the user lookup.
+    Without `db` the lookup opens a short-lived session (WebSocket handshake).
+    """
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
     try:
         payload = decode_token(token)
-    except JWTError:
+    except (JWTError, ValueError):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    user_id = payload.get("sub")
     email = payload.get("email")
+    try:
+        user_id = uuid.UUID(str(payload.get("sub")))
+    except ValueError:
+        user_id = None
     if not user_id or not email:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
 
-    user = db.query(models.User).filter(models.User.id == user_id, models.User.email == email).first()
+    if db is not None:
+        user = await run_db(db, _get_user, user_id, email)
+    else:
+        user = await run_in_session(_get_user, user_id, email)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+
+    token_cache.put(token, user, payload.get("exp"))
     return user
+
+async def get_current_user(
+    authorization: Optional[str] = Header(default=None, alias="Authorization"),
+    db: DbSession = Depends(get_db),
+) -> AuthUser:
+    return await authenticate(_extract_bearer_token(authorization), db)
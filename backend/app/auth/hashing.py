@@ -0,0 +1,117 @@
+# app/auth/hashing.py
+from __future__ import annotations
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from ..config import PASSWORD_HASH_CONCURRENCY, PASSWORD_HASH_QUEUE_TIMEOUT, PASSWORD_HASH_WORKERS
+from ..metrics import PASSWORD_HASH_SECONDS
+from .utils import hash_password, verify_and_rehash
+
+
+class HasherBusy(Exception):
+    """No hashing slot became free within the queue timeout."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt off the event loop and off the shared threadpool, in a small
+    process pool. At most `concurrency` hashes are in flight; callers wait
+    for a slot up to `queue_timeout` seconds, then get HasherBusy.
+    """
+
+    def __init__(self, workers: int, concurrency: int, queue_timeout: float) -> None:
+        self.workers = workers
+        self.concurrency = max(1, concurrency)
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.in_flight = 0
+        self.stats = {
+            "hashed": 0, "verified": 0, "rehashed": 0, "rejected": 0, "completed": 0,
+            "max_waiting": 0, "latency_ms_total": 0.0, "latency_ms_max": 0.0,
+        }
+
+    async def hash(self, password: str) -> str:
+        self.stats["hashed"] += 1
+        return await self._run("hash", hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(matches, new hash if the stored one should be replaced)"""
+        self.stats["verified"] += 1
+        ok, new_hash = await self._run("verify", verify_and_rehash, password, hashed)
+        if new_hash is not None:
+            self.stats["rehashed"] += 1
+        return ok, new_hash
+
+    def start(self) -> None:
+        """Create the process pool; called at startup, before requests arrive."""
+        if self.workers <= 0 or self._executor is not None:
+            return
+        # forkserver (spawn where unavailable): workers never inherit a forked
+        # copy of the event loop, DB pool or broker connection
+        methods = multiprocessing.get_all_start_methods()
+        method = "forkserver" if "forkserver" in methods else "spawn"
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context(method),
+        )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def info(self) -> dict:
+        done = self.stats["completed"]
+        return {
+            **self.stats,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "latency_ms_avg": self.stats["latency_ms_total"] / done if done > 0 else 0.0,
+        }
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    async def _run(self, operation: str, fn, *args):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+
+        self.waiting += 1
+        self.stats["max_waiting"] = max(self.stats["max_waiting"], self.waiting)
+        try:
+            # the timeout cancels acquire() itself, which hands back a slot it
+            # was already granted; wait_for could drop one on a late wakeup
+            async with asyncio.timeout(self.queue_timeout):
+                await self._slots.acquire()
+        except TimeoutError:
+            self.stats["rejected"] += 1
+            raise HasherBusy() from None
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(fn, *args)
+            if self._executor is None:
+                self.start()
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            PASSWORD_HASH_SECONDS.observe(elapsed / 1000, operation)
+            self.stats["completed"] += 1
+            self.stats["latency_ms_total"] += elapsed
+            self.stats["latency_ms_max"] = max(self.stats["latency_ms_max"], elapsed)
+            self.in_flight -= 1
+            self._slots.release()
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_CONCURRENCY, PASSWORD_HASH_QUEUE_TIMEOUT)
@@ -3,37 +3,69 @@ from __future__ import annotations
 import uuid
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from ..db import get_db
+from ..db import DbSession, get_db, run_db
 from .. import models
 from ..schemas import UserCreate, LoginRequest, Token, UserOut
-from .utils import hash_password, verify_password, create_access_token
+from .hashing import HasherBusy, password_hasher
+from .utils import create_access_token
 from .deps import get_current_user
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-@router.post("/register", response_model=UserOut, status_code=status.HTTP_201_CREATED)
-def register(payload: UserCreate, db: Session = Depends(get_db)):
-    """Register a new user."""
-    existing = db.query(models.User).filter(models.User.email == payload.email).first()
-    if existing:
-        raise HTTPException(status_code=409, detail="Email already registered")
+def _get_user_by_email(db: Session, email: str):
+    return db.query(models.User).filter(models.User.email == email).first()
 
-    user = models.User(
-        email=payload.email,
-        password_hash=hash_password(payload.password)
-    )
+def _create_user(db: Session, email: str, password_hash: str) -> models.User:
+    user = models.User(email=email, password_hash=password_hash)
     db.add(user)
     db.commit()
     db.refresh(user)
     return user
 
+def _update_password_hash(db: Session, user_id: uuid.UUID, password_hash: str) -> None:
+    # bulk update: no ORM events, so the user's cached tokens stay valid
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.password_hash: password_hash}, synchronize_session=False
+    )
+    db.commit()
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent sign-ins, try again",
+        headers={"Retry-After": "1"},
+    )
+
+@router.post("/register", response_model=UserOut, status_code=status.HTTP_201_CREATED)
+async def register(payload: UserCreate, db: DbSession = Depends(get_db)):
+    """Register a new user."""
+    existing = await run_db(db, _get_user_by_email, payload.email)
+    if existing:
+        raise HTTPException(status_code=409, detail="Email already registered")
+
+    try:
+        password_hash = await password_hasher.hash(payload.password)
+    except HasherBusy:
+        raise _busy()
+    return await run_db(db, _create_user, payload.email, password_hash)
+
 @router.post("/login", response_model=Token)
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
+async def login(payload: LoginRequest, db: DbSession = Depends(get_db)):
     """Authenticate user and return JWT access token."""
-    user = db.query(models.User).filter(models.User.email == payload.email).first()
+    user = await run_db(db, _get_user_by_email, payload.email)
 
-    if not user or not user.password_hash or not verify_password(payload.password, user.password_hash):
+    if not user or not user.password_hash:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    try:
+        ok, new_hash = await password_hasher.verify(payload.password, user.password_hash)
+    except HasherBusy:
+        raise _busy()
+    if not ok:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # Stored hash was made with another bcrypt cost: replace it transparently
+    if new_hash is not None:
+        await run_db(db, _update_password_hash, user.id, new_hash)
 
     token = create_access_token(subject=str(user.id), email=user.email)
     return {"access_token": token, "token_type": "bearer"}
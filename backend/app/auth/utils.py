@@ -1,13 +1,13 @@
 # app/auth/utils.py
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 from jose import jwt, JWTError
 from passlib.context import CryptContext
-from ..config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES
+from ..config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, BCRYPT_ROUNDS
 
 # JWT configuration
 ALGORITHM = "HS256"
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # ---------------- Password Helpers ---------------- #
 def hash_password(password: str) -> str:
@@ -18,6 +18,22 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_rehash(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password; on success also return a new hash when the stored one
+    was made with another cost (or a deprecated scheme), else None.
+    """
+    if not pwd_context.verify(plain_password, hashed_password):
+        return False, None
+    if pwd_context.needs_update(hashed_password) or _bcrypt_rounds(hashed_password) not in (None, BCRYPT_ROUNDS):
+        return True, pwd_context.hash(plain_password)
+    return True, None
+
+def _bcrypt_rounds(hashed_password: str) -> Optional[int]:
+    # $2b$<cost>$<salt+digest>
+    parts = hashed_password.split("$")
+    return int(parts[2]) if len(parts) == 4 and parts[2].isdigit() else None
+
 # ---------------- Token Helpers ---------------- #
 def create_access_token(*, subject: str, email: str, expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES) -> str:
     """Create a signed JWT access token."""
@@ -0,0 +1,179 @@
+# app/compression.py
+from __future__ import annotations
+import time
+import zlib
+from typing import Callable, Dict, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from . import metrics
+from .config import (
+    HTTP_COMPRESSION_ENCODINGS,
+    HTTP_COMPRESSION_GZIP_LEVEL,
+    HTTP_COMPRESSION_MIN_BYTES,
+    HTTP_COMPRESSION_TYPES,
+    HTTP_COMPRESSION_ZSTD_LEVEL,
+)
+
+try:  # optional: zstd is offered only when zstandard is installed
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+class _Gzip:
+    def __init__(self) -> None:
+        self._z = zlib.compressobj(HTTP_COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits=31: gzip container
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        # sync flush per chunk so streamed bodies (NDJSON exports) stay incremental
+        return self._z.compress(data) + self._z.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _Zstd:
+    def __init__(self) -> None:
+        self._z = zstandard.ZstdCompressor(level=HTTP_COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        flush = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        return self._z.compress(data) + self._z.flush(flush)
+
+
+COMPRESSORS: Dict[str, Callable[[], object]] = {"gzip": _Gzip}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = _Zstd
+
+
+def negotiate(accept_encoding: str, available: Sequence[str]) -> Optional[str]:
+    """The first of `available` (server preference) that Accept-Encoding allows."""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = q
+    for encoding in available:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def record(transport: str, encoding: str, raw: int, sent: int, cpu: float) -> None:
+    metrics.COMPRESSION_IN_BYTES.inc(transport, encoding, amount=raw)
+    metrics.COMPRESSION_OUT_BYTES.inc(transport, encoding, amount=sent)
+    metrics.COMPRESSION_CPU_SECONDS.inc(transport, encoding, amount=cpu)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing HTTP responses with the preferred encoding
+    the client accepts. Skipped for content types outside `types`, bodies
+    already encoded, and complete bodies under `min_size`; streamed bodies
+    are compressed chunk by chunk.
+    """
+
+    def __init__(
+        self,
+        app,
+        encodings: Sequence[str] = HTTP_COMPRESSION_ENCODINGS,
+        min_size: int = HTTP_COMPRESSION_MIN_BYTES,
+        types: Sequence[str] = HTTP_COMPRESSION_TYPES,
+    ) -> None:
+        self.app = app
+        self.encodings = [e for e in encodings if e in COMPRESSORS]
+        self.min_size = min_size
+        self.types = [t.strip().lower() for t in types if t.strip()]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            return await self.app(scope, receive, send)
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        await self.app(scope, receive, _Responder(self, encoding, send))
+
+    def compressible(self, content_type: str) -> bool:
+        media_type = content_type.split(";")[0].strip().lower()
+        return any(
+            media_type.startswith(t) if t.endswith("/") else media_type == t
+            for t in self.types
+        )
+
+
+class _Responder:
+    """Wraps `send`: holds the response start until the first body chunk decides."""
+
+    def __init__(self, policy: CompressionMiddleware, encoding: str, send) -> None:
+        self.policy = policy
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[dict] = None
+        self.compressor = None
+
+    async def __call__(self, message: dict) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self._release()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+            reason = self._skip_reason(headers, body, more)
+            if reason is not None:
+                if reason != "type":
+                    metrics.COMPRESSION_SKIPPED.inc("http", reason)
+                if reason == "small":
+                    headers.add_vary_header("Accept-Encoding")
+                await self.send(start)
+                await self.send(message)
+                return
+            self.compressor = COMPRESSORS[self.encoding]()
+            data = self._compress(body, final=not more)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(data))
+            await self.send(start)
+            await self.send({"type": "http.response.body", "body": data, "more_body": more})
+            return
+
+        if self.compressor is None:
+            await self.send(message)
+            return
+        data = self._compress(body, final=not more)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more})
+
+    def _skip_reason(self, headers: MutableHeaders, body: bytes, more: bool) -> Optional[str]:
+        if "content-encoding" in headers:
+            return "encoded"
+        if not self.policy.compressible(headers.get("content-type", "")):
+            return "type"
+        if not more and len(body) < self.policy.min_size:
+            return "small"
+        return None
+
+    def _compress(self, data: bytes, final: bool) -> bytes:
+        started = time.thread_time()
+        out = self.compressor.compress(data, final)
+        record("http", self.encoding, len(data), len(out), time.thread_time() - started)
+        return out
+
+    async def _release(self) -> None:
+        if self.start is not None:
+            start, self.start = self.start, None
+            await self.send(start)
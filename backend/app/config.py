@@ -1,4 +1,5 @@
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -6,4 +7,152 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:postgres@db:5432/postgres")
 SECRET_KEY: str = os.getenv("SECRET_KEY", "CHANGE_ME")
 ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
-ENV: str = os.getenv("ENV", "dev")
\ No newline at end of file
+ENV: str = os.getenv("ENV", "dev")
+
+# Opt-in asyncio database mode for routes and the WebSocket manager.
+# The sync DATABASE_URL engine is still used by Alembic.
+DB_ASYNC: bool = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+ASYNC_DATABASE_URL: str = os.getenv(
+    "ASYNC_DATABASE_URL",
+    re.sub(r"^postgres(ql)?(\+\w+)?://", "postgresql+asyncpg://", DATABASE_URL),
+)
+
+# WebSocket fan-out backend: "postgres" (LISTEN/NOTIFY, multi-worker),
+# "memory" (single process) or a dotted "module:Class" Broker path
+WS_BROKER: str = os.getenv("WS_BROKER", "postgres")
+
+# Per-connection outbound queue and what to do when a client cannot keep up:
+# "drop_oldest", "coalesce" or "disconnect" (closes with WS_SLOW_CONSUMER_CLOSE_CODE)
+WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SLOW_CONSUMER_POLICY: str = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+WS_SLOW_CONSUMER_CLOSE_CODE: int = int(os.getenv("WS_SLOW_CONSUMER_CLOSE_CODE", "1013"))
+
+# JSON encoder for WebSocket frames and list responses: "auto" (orjson when
+# installed, else stdlib), "orjson" or "json"
+JSON_ENCODER: str = os.getenv("JSON_ENCODER", "auto")
+
+# Write-behind persistence of WebSocket messages: rows are inserted in batches
+# of up to WS_WRITE_BATCH_SIZE, at most WS_WRITE_FLUSH_MS after the first one.
+# WS_WRITE_DURABILITY "flush" acks after commit, "immediate" acks once queued.
+WS_WRITE_BATCH_SIZE: int = int(os.getenv("WS_WRITE_BATCH_SIZE", "500"))
+WS_WRITE_FLUSH_MS: int = int(os.getenv("WS_WRITE_FLUSH_MS", "50"))
+WS_WRITE_DURABILITY: str = os.getenv("WS_WRITE_DURABILITY", "flush")
+WS_WRITE_MAX_PENDING: int = int(os.getenv("WS_WRITE_MAX_PENDING", "10000"))
+
+# Inbound WebSocket frame limits (token bucket: frames/second and burst size),
+# per connection, per user and per session; a rate of 0 disables the scope.
+# Every frame type counts, except stream_delta frames, which a streamed reply
+# sends many of: they draw from their own per-connection WS_*_STREAM_DELTA bucket.
+# Throttled frames get an error frame ("reject") or close the socket ("close").
+WS_RATE_CONNECTION: float = float(os.getenv("WS_RATE_CONNECTION", "5"))
+WS_BURST_CONNECTION: float = float(os.getenv("WS_BURST_CONNECTION", "10"))
+WS_RATE_USER: float = float(os.getenv("WS_RATE_USER", "10"))
+WS_BURST_USER: float = float(os.getenv("WS_BURST_USER", "20"))
+WS_RATE_SESSION: float = float(os.getenv("WS_RATE_SESSION", "50"))
+WS_BURST_SESSION: float = float(os.getenv("WS_BURST_SESSION", "100"))
+WS_RATE_STREAM_DELTA: float = float(os.getenv("WS_RATE_STREAM_DELTA", "50"))
+WS_BURST_STREAM_DELTA: float = float(os.getenv("WS_BURST_STREAM_DELTA", "100"))
+WS_RATE_ACTION: str = os.getenv("WS_RATE_ACTION", "reject")
+WS_RATE_CLOSE_CODE: int = int(os.getenv("WS_RATE_CLOSE_CODE", "1013"))
+
+# Ephemeral WebSocket events (never persisted): accepted event names, the
+# minimum interval between frames per user, session and event, and the largest
+# accepted `data` payload (JSON-encoded bytes)
+WS_EPHEMERAL_EVENTS: list[str] = os.getenv("WS_EPHEMERAL_EVENTS", "typing,cursor,read_hint").split(",")
+WS_EVENT_INTERVAL_MS: int = int(os.getenv("WS_EVENT_INTERVAL_MS", "300"))
+WS_EVENT_MAX_BYTES: int = int(os.getenv("WS_EVENT_MAX_BYTES", "1024"))
+
+# Reconnect replay: each worker keeps the last WS_REPLAY_BUFFER message frames
+# of every session it is subscribed to; older gaps are read from the database,
+# at most WS_REPLAY_MAX_MESSAGES per reconnect.
+WS_REPLAY_BUFFER: int = int(os.getenv("WS_REPLAY_BUFFER", "500"))
+WS_REPLAY_MAX_MESSAGES: int = int(os.getenv("WS_REPLAY_MAX_MESSAGES", "1000"))
+
+# Hot-tail cache serving message history reads without a cursor, for sessions
+# with live sockets on this worker: up to MESSAGE_CACHE_PER_SESSION recent
+# messages per session and MESSAGE_CACHE_MAX_BYTES in total (least recently
+# read sessions are evicted first); 0 disables it.
+MESSAGE_CACHE_PER_SESSION: int = int(os.getenv("MESSAGE_CACHE_PER_SESSION", "200"))
+MESSAGE_CACHE_MAX_BYTES: int = int(os.getenv("MESSAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Read cursors: updates are coalesced per participant in memory and written
+# in one batch every READ_CURSOR_FLUSH_MS
+READ_CURSOR_FLUSH_MS: int = int(os.getenv("READ_CURSOR_FLUSH_MS", "2000"))
+
+# Verified access tokens -> user snapshots, per worker: at most AUTH_CACHE_SIZE
+# entries, each kept AUTH_CACHE_TTL_SECONDS (never past the token's expiry);
+# a size of 0 disables it.
+AUTH_CACHE_SIZE: int = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_SECONDS: float = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+
+# Password hashing: bcrypt cost, and a pool of PASSWORD_HASH_WORKERS processes
+# (0 runs bcrypt in the threadpool) with at most PASSWORD_HASH_CONCURRENCY
+# hashes in flight; requests waiting longer than PASSWORD_HASH_QUEUE_TIMEOUT
+# seconds for a slot get a 503.
+BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_CONCURRENCY: int = int(os.getenv("PASSWORD_HASH_CONCURRENCY", "8"))
+PASSWORD_HASH_QUEUE_TIMEOUT: float = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "5"))
+
+# Migrations when a worker starts: "upgrade" (migrate under a Postgres advisory
+# lock, skipped when already at head), "check" (refuse to start unless at head)
+# or "off" (run `python -m app.migrations upgrade` out of band)
+MIGRATE_ON_STARTUP: str = os.getenv("MIGRATE_ON_STARTUP", "upgrade")
+
+# Database connection pools (per engine, per worker). DB_POOL_CLASS "queue"
+# keeps DB_POOL_SIZE connections plus up to DB_MAX_OVERFLOW extra, waiting
+# DB_POOL_TIMEOUT seconds for one when all are busy; "null" opens a connection
+# per checkout, for use behind an external pooler such as PgBouncer.
+# Connections are replaced after DB_POOL_RECYCLE seconds; DB_POOL_PRE_PING
+# additionally tests each one at checkout (one extra round trip).
+DB_POOL_CLASS: str = os.getenv("DB_POOL_CLASS", "queue")
+DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+
+# Bulk message ingest (POST /sessions/{id}/messages/bulk): most messages
+# accepted in one request
+BULK_INGEST_MAX_MESSAGES: int = int(os.getenv("BULK_INGEST_MAX_MESSAGES", "20000"))
+
+# Streamed messages (stream_start / stream_delta / stream_end frames): deltas
+# are broadcast at most every WS_STREAM_FLUSH_MS and never stored; the text is
+# saved as one message when the stream ends, is aborted, its socket closes or
+# it has been idle for WS_STREAM_IDLE_SECONDS.
+WS_STREAM_FLUSH_MS: int = int(os.getenv("WS_STREAM_FLUSH_MS", "50"))
+WS_STREAM_MAX_CHARS: int = int(os.getenv("WS_STREAM_MAX_CHARS", "200000"))
+WS_STREAM_IDLE_SECONDS: float = float(os.getenv("WS_STREAM_IDLE_SECONDS", "60"))
+WS_STREAM_MAX_PER_CONNECTION: int = int(os.getenv("WS_STREAM_MAX_PER_CONNECTION", "4"))
+
+# Tool payloads: a tool_calls item or a tool_metadata object whose JSON exceeds
+# TOOL_PAYLOAD_INLINE_MAX_BYTES is stored in message_payloads and replaced by
+# a reference, fetched from GET /sessions/{id}/messages/{message_id}/tools
+TOOL_PAYLOAD_INLINE_MAX_BYTES: int = int(os.getenv("TOOL_PAYLOAD_INLINE_MAX_BYTES", "8192"))
+
+# HTTP response compression (app/compression.py): encodings in server preference
+# order ("zstd" needs the optional zstandard package; empty disables), responses
+# smaller than HTTP_COMPRESSION_MIN_BYTES go out as is, and only content types
+# matching HTTP_COMPRESSION_TYPES (entries ending in "/" match a prefix) are compressed
+HTTP_COMPRESSION_ENCODINGS: list[str] = [
+    e.strip() for e in os.getenv("HTTP_COMPRESSION_ENCODINGS", "zstd,gzip").split(",") if e.strip()
+]
+HTTP_COMPRESSION_MIN_BYTES: int = int(os.getenv("HTTP_COMPRESSION_MIN_BYTES", "1024"))
+HTTP_COMPRESSION_TYPES: list[str] = os.getenv(
+    "HTTP_COMPRESSION_TYPES", "application/json,application/x-ndjson,text/"
+).split(",")
+HTTP_COMPRESSION_GZIP_LEVEL: int = int(os.getenv("HTTP_COMPRESSION_GZIP_LEVEL", "5"))
+HTTP_COMPRESSION_ZSTD_LEVEL: int = int(os.getenv("HTTP_COMPRESSION_ZSTD_LEVEL", "3"))
+
+# WebSocket permessage-deflate (app/ws/deflate.py, run uvicorn with
+# --ws app.ws.deflate:WebSocketProtocol): messages under WS_COMPRESSION_MIN_BYTES
+# are sent uncompressed. Window bits (9-15) and memLevel set per-socket memory;
+# no context takeover trades compression ratio for no idle compressor state
+WS_COMPRESSION: bool = os.getenv("WS_COMPRESSION", "true").lower() in ("1", "true", "yes")
+WS_COMPRESSION_MIN_BYTES: int = int(os.getenv("WS_COMPRESSION_MIN_BYTES", "512"))
+WS_COMPRESSION_LEVEL: int = int(os.getenv("WS_COMPRESSION_LEVEL", "6"))
+WS_COMPRESSION_WINDOW_BITS: int = int(os.getenv("WS_COMPRESSION_WINDOW_BITS", "12"))
+WS_COMPRESSION_MEM_LEVEL: int = int(os.getenv("WS_COMPRESSION_MEM_LEVEL", "5"))
+WS_COMPRESSION_NO_CONTEXT_TAKEOVER: bool = (
+    os.getenv("WS_COMPRESSION_NO_CONTEXT_TAKEOVER", "false").lower() in ("1", "true", "yes")
+)
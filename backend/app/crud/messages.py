@@ -1,8 +1,14 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from typing import Callable, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session, defer
+from sqlalchemy import desc, func, insert, select, update
+import base64
 import uuid
 from .. import models
+from . import sessions as crud_sessions
+from . import payloads as crud_payloads
+
+PREVIEW_LENGTH = 200  # chat_sessions.last_message_preview
 
 def create_message(
     db: Session,
@@ -12,36 +18,290 @@ def create_message(
     content: str,
     tool_calls: Optional[list] = None,
     tool_metadata: Optional[dict] = None,  # renamed
+    before_commit: Optional[Callable[[Session, models.Message], None]] = None,
 ) -> models.Message:
-    """Create a new message in a chat session."""
+    """
+    Create a new message in a chat session; large tool payloads are stored
+    out of line. `before_commit` runs after the insert, in its transaction.
+    """
+    created_at = datetime.now(timezone.utc)
+    pending: crud_payloads.Pending = {}
     message = models.Message(
         session_id=session_id,
+        seq=allocate_seq(db, session_id, last_at=created_at, last_content=content),
+        created_at=created_at,
         user_id=user_id,
         role=models.MessageRole(role),
         content=content,
-        tool_calls=_normalize_tool_calls(tool_calls),
-        tool_metadata=tool_metadata or {},  # renamed
+        **_tool_values(tool_calls, tool_metadata, pending),
     )
+    crud_payloads.save_payloads(db, session_id, pending)
     db.add(message)
+    if before_commit is not None:
+        db.flush()
+        before_commit(db, message)
     db.commit()
     db.refresh(message)
     return message
 
-def list_messages_all(
+def bulk_create_messages(
     db: Session,
     session_id: uuid.UUID,
-    order_desc: bool = False
-) -> List[models.Message]:
-    """Return all messages for a session, ordered by created_at."""
-    q = db.query(models.Message).filter(models.Message.session_id == session_id)
-    q = q.order_by(desc(models.Message.created_at)) if order_desc else q.order_by(models.Message.created_at)
-    messages = q.all()
+    user_id: Optional[uuid.UUID],
+    items: List[dict],
+) -> dict:
+    """
+    Insert an ordered batch of messages (MessageCreate dicts) in one
+    transaction: one seq allocation for the whole batch and multi-row
+    INSERTs. "user" messages are attributed to `user_id`, others to nobody,
+    as in create_message. Returns the seq range written.
+    """
+    n = len(items)
+    # distinct, increasing timestamps ending now, so created_at order
+    # matches the transcript (seq) order
+    now = datetime.now(timezone.utc)
+    first = allocate_seq(db, session_id, n, last_at=now, last_content=items[-1]["content"])
+    pending: crud_payloads.Pending = {}
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "session_id": session_id,
+            "seq": first + i,
+            "created_at": now - timedelta(microseconds=n - 1 - i),
+            "user_id": user_id if item["role"] == models.MessageRole.user.value else None,
+            "role": models.MessageRole(item["role"]),
+            "content": item["content"],
+            **_tool_values(item.get("tool_calls"), item.get("tool_metadata"), pending),
+        }
+        for i, item in enumerate(items)
+    ]
+    crud_payloads.save_payloads(db, session_id, pending)
+    db.execute(insert(models.Message), rows)
+    db.commit()
+    return {"session_id": session_id, "count": n, "first_seq": first, "last_seq": first + n - 1}
+
+def allocate_seq(
+    db: Session,
+    session_id: uuid.UUID,
+    n: int = 1,
+    last_at: Optional[datetime] = None,
+    last_content: Optional[str] = None,
+) -> int:
+    """
+    Reserve `n` consecutive sequence numbers in a session and return the
+    first. The session row stays locked until the caller commits, which
+    keeps numbers gap-free and in commit order across workers.
+
+    `last_at`/`last_content` describe the last of the `n` messages and
+    update the session's inbox preview in the same statement.
+    """
+    S = models.ChatSession
+    values = {"last_seq": S.last_seq + n}
+    if last_at is not None:
+        values.update(
+            last_message_at=last_at,
+            last_message_preview=message_preview(last_content or ""),
+            last_activity_at=func.greatest(S.last_activity_at, last_at),
+        )
+    last = db.execute(
+        update(S)
+        .where(S.id == session_id)
+        .values(**values)
+        .returning(S.last_seq)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    return last - n + 1
+
+def message_preview(content: str) -> str:
+    """Single-line excerpt of a message for the session inbox."""
+    return " ".join(content.split())[:PREVIEW_LENGTH]
+
+def list_messages_page(
+    db: Session,
+    session_id: uuid.UUID,
+    limit: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    order_desc: bool = False,
+    include_tools: bool = True,
+) -> Tuple[List[models.Message], Optional[str]]:
+    """
+    Return one page of a session's messages using keyset pagination on
+    seq, plus the cursor for the next page (None at the end). seq is the
+    order messages are broadcast and cached in, so pages match the hot-tail
+    cache exactly.
+
+    Without a cursor the newest `limit` messages (the tail) are returned and
+    the next cursor pages backwards; `before` pages backwards from a cursor,
+    `after` pages forwards. The page itself is sorted per `order_desc`.
+    Without `include_tools` the tool columns are not loaded at all.
+    """
+    M = models.Message
+    q = db.query(M).filter(M.session_id == session_id)
+    if not include_tools:
+        q = q.options(defer(M.tool_calls, raiseload=True), defer(M.tool_metadata, raiseload=True))
+    # served by the unique ix_messages_session_seq
+    forward = after is not None
+    if forward:
+        q = q.filter(M.seq > decode_seq_cursor(after)).order_by(M.seq)
+    else:
+        if before is not None:
+            q = q.filter(M.seq < decode_seq_cursor(before))
+        q = q.order_by(desc(M.seq))
+
+    messages = q.limit(limit + 1).all()
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    next_cursor = encode_seq_cursor(messages[-1].seq) if has_more else None
+
+    # rows come back in paging direction; present them in the requested order
+    if forward == order_desc:
+        messages.reverse()
+    if not include_tools:
+        return messages, next_cursor
     for m in messages:
         m.tool_calls = _normalize_tool_calls(m.tool_calls)
         if m.tool_metadata is None:
             m.tool_metadata = {}
+    return messages, next_cursor
+
+def get_message_tools(db: Session, session_id: uuid.UUID, message_id: uuid.UUID) -> Optional[dict]:
+    """A message's tool_calls and tool_metadata with out-of-line payloads loaded."""
+    M = models.Message
+    row = db.execute(
+        select(M.tool_calls, M.tool_metadata).where(M.session_id == session_id, M.id == message_id)
+    ).first()
+    if row is None:
+        return None
+    tool_calls, tool_metadata = crud_payloads.resolve(
+        db, session_id, _normalize_tool_calls(row.tool_calls), row.tool_metadata,
+    )
+    return {"id": message_id, "tool_calls": tool_calls, "tool_metadata": tool_metadata}
+
+def list_messages_since(
+    db: Session,
+    session_id: uuid.UUID,
+    since: int,
+    limit: int,
+) -> List[Tuple[models.Message, Optional[str]]]:
+    """
+    Messages with seq > `since` in sequence order, with the author's email,
+    for replaying to a reconnecting client. Served by ix_messages_session_seq.
+    """
+    M = models.Message
+    q = (
+        db.query(M, models.User.email)
+        .outerjoin(models.User, models.User.id == M.user_id)
+        .filter(M.session_id == session_id, M.seq > since)
+        .order_by(M.seq)
+        .limit(limit)
+    )
+    return q.all()
+
+def list_messages_tail(db: Session, session_id: uuid.UUID, limit: int) -> List[models.Message]:
+    """The last `limit` messages of a session by seq, oldest first."""
+    M = models.Message
+    messages = (
+        db.query(M)
+        .filter(M.session_id == session_id)
+        .order_by(desc(M.seq))
+        .limit(limit)
+        .all()
+    )
+    messages.reverse()
     return messages
 
+def export_query(session_id: Optional[uuid.UUID] = None, user_id: Optional[uuid.UUID] = None):
+    """
+    Select messages for export: one session, or every session the user owns
+    or participates in. Ordered by session, then sequence.
+    """
+    M = models.Message
+    stmt = select(M)
+    if session_id is not None:
+        stmt = stmt.where(M.session_id == session_id)
+    if user_id is not None:
+        stmt = stmt.where(crud_sessions.in_member_sessions(M.session_id, user_id))
+    return stmt.order_by(M.session_id, M.seq)
+
+def search_messages(
+    db: Session,
+    user_id: uuid.UUID,
+    q: str,
+    limit: int,
+    offset: int = 0,
+    session_id: Optional[uuid.UUID] = None,
+) -> List[dict]:
+    """
+    Messages matching a web-search style query (words, "phrases", -exclusions,
+    OR) in sessions the user owns or participates in, best match first.
+    Matches come from the GIN index on Message.search_vector; snippets are
+    only built for the returned page.
+    """
+    M = models.Message
+    query = func.websearch_to_tsquery("english", q)
+    rank = func.ts_rank_cd(M.search_vector, query)
+    hits = (
+        select(M.id, rank.label("rank"))
+        .where(M.search_vector.op("@@")(query), crud_sessions.in_member_sessions(M.session_id, user_id))
+    )
+    if session_id is not None:
+        hits = hits.where(M.session_id == session_id)
+    hits = hits.order_by(desc("rank"), M.id).limit(limit).offset(offset).subquery()
+
+    snippet = func.ts_headline(
+        "english", M.content, query,
+        "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=24, MinWords=8",
+    )
+    rows = db.execute(
+        select(M.id, M.session_id, models.ChatSession.title, M.seq, M.role, M.created_at, hits.c.rank, snippet)
+        .join(hits, hits.c.id == M.id)
+        .join(models.ChatSession, models.ChatSession.id == M.session_id)
+        .order_by(desc(hits.c.rank), M.id)
+    ).all()
+    return [
+        {
+            "id": r[0], "session_id": r[1], "session_title": r[2], "seq": r[3],
+            "role": r[4], "created_at": r[5], "rank": r[6], "snippet": r[7],
+        }
+        for r in rows
+    ]
+
+def export_row(message: models.Message) -> dict:
+    """Plain dict of a message as written to NDJSON exports."""
+    return {
+        "id": message.id,
+        "session_id": message.session_id,
+        "seq": message.seq,
+        "user_id": message.user_id,
+        "role": message.role,
+        "content": message.content,
+        "tool_calls": _normalize_tool_calls(message.tool_calls),
+        "tool_metadata": message.tool_metadata or {},
+        "created_at": message.created_at,
+    }
+
+def encode_seq_cursor(seq: int) -> str:
+    """Opaque cursor for a message's position in its session."""
+    return base64.urlsafe_b64encode(f"seq:{seq}".encode()).decode().rstrip("=")
+
+def decode_seq_cursor(cursor: str) -> int:
+    """Inverse of encode_seq_cursor; raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        kind, seq = raw.split(":", 1)
+        if kind != "seq":
+            raise ValueError
+        return int(seq)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _tool_values(tool_calls, tool_metadata, pending: crud_payloads.Pending) -> dict:
+    tool_calls, tool_metadata = crud_payloads.externalize(
+        _normalize_tool_calls(tool_calls), tool_metadata or {}, pending,
+    )
+    return {"tool_calls": tool_calls, "tool_metadata": tool_metadata}
+
 def _normalize_tool_calls(tool_calls):
     """Ensure tool_calls is always a list."""
     if not tool_calls:
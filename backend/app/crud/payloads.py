@@ -0,0 +1,91 @@
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import uuid
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from .. import models
+from ..config import TOOL_PAYLOAD_INLINE_MAX_BYTES
+
+REF_KEY = "$ref"
+REF_PREFIX = "sha256:"
+
+# hash -> message_payloads row values, collected before they are written
+Pending = Dict[str, dict]
+
+def is_ref(value: Any) -> bool:
+    return isinstance(value, dict) and isinstance(value.get(REF_KEY), str)
+
+def externalize(
+    tool_calls: Optional[list],
+    tool_metadata: Optional[dict],
+    pending: Pending,
+    limit: int = TOOL_PAYLOAD_INLINE_MAX_BYTES,
+) -> Tuple[Optional[list], Optional[dict]]:
+    """
+    Replace tool_calls items and a tool_metadata object larger than `limit`
+    bytes by reference stubs, adding the payloads to `pending` (see
+    save_payloads). Tool call stubs keep the tool name, which search indexes.
+    Client input carrying "$ref" is rejected (ValueError), never stored as is.
+    """
+    if tool_calls:
+        calls = []
+        for call in tool_calls:
+            stub = _stub(call, pending, limit)
+            if stub is not None and isinstance(call, dict) and "tool" in call:
+                stub = {"tool": call["tool"], **stub}
+            calls.append(stub or call)
+        tool_calls = calls
+    if tool_metadata:
+        tool_metadata = _stub(tool_metadata, pending, limit) or tool_metadata
+    return tool_calls, tool_metadata
+
+def save_payloads(db: Session, session_id: uuid.UUID, pending: Pending) -> None:
+    """
+    Insert collected payloads for a session in the caller's transaction;
+    existing ones are kept. They are deleted with the session.
+    """
+    if not pending:
+        return
+    stmt = insert(models.MessagePayload).on_conflict_do_nothing(index_elements=["session_id", "hash"])
+    db.execute(stmt, [{**values, "session_id": session_id} for values in pending.values()])
+
+def resolve(
+    db: Session,
+    session_id: uuid.UUID,
+    tool_calls: Optional[list],
+    tool_metadata: Optional[dict],
+) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    tool_calls / tool_metadata of a message in `session_id` with every
+    reference replaced by that session's payload, in one query.
+    """
+    tool_calls = tool_calls or []
+    tool_metadata = tool_metadata or {}
+    hashes = {_hash_of(v) for v in [*tool_calls, tool_metadata] if is_ref(v)}
+    if not hashes:
+        return tool_calls, tool_metadata
+    found = dict(db.execute(
+        select(models.MessagePayload.hash, models.MessagePayload.data)
+        .where(models.MessagePayload.session_id == session_id, models.MessagePayload.hash.in_(hashes))
+    ).all())
+
+    def _load(value):
+        return found.get(_hash_of(value), value) if is_ref(value) else value
+
+    return [_load(call) for call in tool_calls], _load(tool_metadata)
+
+def _stub(value: Any, pending: Pending, limit: int) -> Optional[dict]:
+    if is_ref(value):
+        raise ValueError(f"{REF_KEY} is reserved for stored payload references")
+    raw = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+    if len(raw) <= limit:
+        return None
+    digest = hashlib.sha256(raw).hexdigest()
+    pending.setdefault(digest, {"hash": digest, "data": json.loads(raw), "size": len(raw)})
+    return {REF_KEY: REF_PREFIX + digest, "size": len(raw)}
+
+def _hash_of(ref: dict) -> str:
+    value = ref[REF_KEY]
+    return value[len(REF_PREFIX):] if value.startswith(REF_PREFIX) else value
@@ -1,8 +1,9 @@
 from __future__ import annotations
+import base64
 import uuid
 import secrets
 from datetime import timedelta, datetime, timezone
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
@@ -10,31 +11,12 @@ from sqlalchemy.orm import aliased
 
 
 from .. import models
-from sqlalchemy import or_
+from sqlalchemy import and_, bindparam, desc, func, or_, select, update
 
 # ============================================================
 # Participants CRUD
 # ============================================================
 
-def add_owner_as_participant(db: Session, session_id: uuid.UUID, owner_id: uuid.UUID):
-    """Ensure session owner is added as participant with role=owner"""
-    row = models.ChatSessionParticipant(
-        session_id=session_id,
-        user_id=owner_id,
-        role="owner"
-    )
-    db.add(row)
-    try:
-        db.commit()
-        db.refresh(row)
-    except IntegrityError:
-        db.rollback()
-        row = db.query(models.ChatSessionParticipant).filter_by(
-            session_id=session_id, user_id=owner_id
-        ).first()
-    return row
-
-
 def add_participant(db: Session, session_id: uuid.UUID, user_id: uuid.UUID, role: str = "member"):
     """Add a participant, default role=member. Handles duplicate gracefully."""
     row = models.ChatSessionParticipant(
@@ -55,22 +37,46 @@ def add_participant(db: Session, session_id: uuid.UUID, user_id: uuid.UUID, role
 
 
 def is_participant(db: Session, session_id: uuid.UUID, user_id: uuid.UUID) -> bool:
-    """Check if a user is a participant or the owner of the session"""
-    # Direct participant
-    if db.query(models.ChatSessionParticipant).filter(
+    """Check if a user is a participant or the owner of the session, in a single query"""
+    is_owner = select(models.ChatSession.id).where(
+        models.ChatSession.id == session_id,
+        models.ChatSession.user_id == user_id
+    ).exists()
+    is_member = select(models.ChatSessionParticipant.user_id).where(
         models.ChatSessionParticipant.session_id == session_id,
         models.ChatSessionParticipant.user_id == user_id
-    ).first():
-        return True
+    ).exists()
+    return bool(db.scalar(select(or_(is_owner, is_member))))
 
-    # Session owner
-    if db.query(models.ChatSession).filter(
-        models.ChatSession.id == session_id,
-        models.ChatSession.user_id == user_id
-    ).first():
-        return True
 
-    return False
+def get_read_state(db: Session, session_id: uuid.UUID, user_id: uuid.UUID) -> Optional[Tuple[int, int]]:
+    """(last_read_seq, session last_seq) for a participant, or None if they have no participant row"""
+    row = (
+        db.query(models.ChatSessionParticipant.last_read_seq, models.ChatSession.last_seq)
+        .join(models.ChatSession, models.ChatSession.id == models.ChatSessionParticipant.session_id)
+        .filter(
+            models.ChatSessionParticipant.session_id == session_id,
+            models.ChatSessionParticipant.user_id == user_id,
+        )
+        .first()
+    )
+    return (row[0], row[1]) if row else None
+
+
+def advance_read_cursors(db: Session, cursors: List[Tuple[uuid.UUID, uuid.UUID, int]]) -> None:
+    """
+    Move participants' read cursors forward to the given (session_id, user_id, seq),
+    never backwards and never past the session's last message, in one batch.
+    """
+    p = models.ChatSessionParticipant.__table__  # Core: one statement executed for many rows
+    last_seq = select(models.ChatSession.last_seq).where(models.ChatSession.id == p.c.session_id).scalar_subquery()
+    db.execute(
+        update(p)
+        .where(p.c.session_id == bindparam("sid"), p.c.user_id == bindparam("uid"))
+        .values(last_read_seq=func.greatest(p.c.last_read_seq, func.least(bindparam("seq"), last_seq))),
+        [{"sid": sid, "uid": uid, "seq": seq} for sid, uid, seq in cursors],
+    )
+    db.commit()
 
 
 def list_participants(db: Session, session_id: uuid.UUID) -> List[models.ChatSessionParticipant]:
@@ -86,8 +92,10 @@ def list_participants(db: Session, session_id: uuid.UUID) -> List[models.ChatSes
 
 # --- Sessions ---
 def create_session(db: Session, user_id: uuid.UUID, title: str) -> models.ChatSession:
-    session = models.ChatSession(user_id=user_id, title=title)
+    """Create a session; the owner is added as a participant (role=owner) in the same transaction"""
+    session = models.ChatSession(id=uuid.uuid4(), user_id=user_id, title=title)
     db.add(session)
+    db.add(models.ChatSessionParticipant(session_id=session.id, user_id=user_id, role="owner"))
     db.commit()
     db.refresh(session)
     return session
@@ -107,20 +115,70 @@ def get_session(db: Session, session_id: uuid.UUID, user_id: uuid.UUID) -> Optio
 
 
 
+def in_member_sessions(session_col, user_id: uuid.UUID):
+    """Filter on `session_col` for sessions the user owns or participates in (no join, no duplicates)"""
+    owned = select(models.ChatSession.id).where(models.ChatSession.user_id == user_id)
+    joined = select(models.ChatSessionParticipant.session_id).where(
+        models.ChatSessionParticipant.user_id == user_id
+    )
+    return or_(session_col.in_(owned), session_col.in_(joined))
+
+
 def list_sessions_for_user(db: Session, user_id: uuid.UUID) -> List[models.ChatSession]:
+    """All sessions the user owns or participates in, each once, most recently active first"""
     return (
         db.query(models.ChatSession)
-        .outerjoin(
-            models.ChatSessionParticipant,
-            models.ChatSessionParticipant.session_id == models.ChatSession.id
-        )
-        .filter(
-            (models.ChatSessionParticipant.user_id == user_id) |
-            (models.ChatSession.user_id == user_id)  # include owner
-        )
+        .filter(in_member_sessions(models.ChatSession.id, user_id))
+        .order_by(desc(models.ChatSession.last_activity_at), desc(models.ChatSession.id))
         .all()
     )
 
+
+def list_inbox(
+    db: Session,
+    user_id: uuid.UUID,
+    limit: int,
+    before: Optional[str] = None,
+) -> Tuple[List[models.ChatSession], Optional[str]]:
+    """
+    One page of the user's sessions by last activity (newest first), using
+    keyset pagination on (last_activity_at, id), plus the next page's cursor.
+    Previews and counts are read from the session rows, not from messages;
+    unread counts come from the caller's read cursor.
+    """
+    S, P = models.ChatSession, models.ChatSessionParticipant
+    q = (
+        db.query(S, P.last_read_seq)
+        .outerjoin(P, and_(P.session_id == S.id, P.user_id == user_id))
+        .filter(in_member_sessions(S.id, user_id))
+    )
+    if before is not None:
+        ts, sid = decode_inbox_cursor(before)
+        q = q.filter(S.last_activity_at <= ts, or_(S.last_activity_at < ts, S.id < sid))
+    rows = q.order_by(desc(S.last_activity_at), desc(S.id)).limit(limit + 1).all()
+    sessions = []
+    for session, last_read_seq in rows:
+        session.last_read_seq = last_read_seq or 0  # read by InboxSessionOut
+        sessions.append(session)
+    has_more = len(sessions) > limit
+    sessions = sessions[:limit]
+    next_cursor = encode_inbox_cursor(sessions[-1].last_activity_at, sessions[-1].id) if has_more else None
+    return sessions, next_cursor
+
+def encode_inbox_cursor(last_activity_at: datetime, session_id: uuid.UUID) -> str:
+    """Opaque cursor for a session's (last_activity_at, id) position in the inbox."""
+    raw = f"{last_activity_at.isoformat()}|{session_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_inbox_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Inverse of encode_inbox_cursor; raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, sid = raw.split("|", 1)
+        return datetime.fromisoformat(ts), uuid.UUID(sid)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
 def update_session(db: Session, chat_session: models.ChatSession, title: str) -> models.ChatSession:
     chat_session.title = title
     db.add(chat_session)
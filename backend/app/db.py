@@ -1,13 +1,113 @@
 # app/db.py
+import time
+from typing import Union
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from .config import DATABASE_URL
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from .config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, DB_ASYNC,
+    DB_POOL_CLASS, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+)
+
+
+# -------------------------
+# Connection pools
+# -------------------------
+
+class _TimedPool:
+    """Pool mixin recording how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = {"checkouts": 0, "timeouts": 0, "connects": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+
+    def recreate(self):
+        # dispose() / invalidation rebuild the pool: keep counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            self.stats["timeouts"] += 1
+            raise
+        finally:
+            waited = (time.perf_counter() - start) * 1000
+            self.stats["checkouts"] += 1
+            self.stats["wait_ms_total"] += waited
+            self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], waited)
+
+    def _create_connection(self):
+        self.stats["connects"] += 1
+        return super()._create_connection()
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+class TimedNullPool(_TimedPool, NullPool):
+    pass
+
+
+def _pool_options(is_async: bool, url: str) -> dict:
+    """create_engine pool arguments from the DB_POOL_* settings."""
+    if url.startswith("sqlite"):
+        return {}  # local scripts / tests: keep SQLAlchemy's sqlite defaults
+    if DB_POOL_CLASS == "null":
+        # An external pooler (PgBouncer, RDS Proxy) owns the connections: open
+        # one per checkout, and no server-side prepared statements, which do
+        # not survive transaction pooling
+        options = {"poolclass": TimedNullPool, "pool_pre_ping": False}
+        if is_async:
+            options["connect_args"] = {"prepared_statement_cache_size": 0, "statement_cache_size": 0}
+        return options
+    return {
+        "poolclass": TimedAsyncQueuePool if is_async else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        # connections older than this are replaced at checkout, instead of
+        # pinging on every checkout (DB_POOL_PRE_PING turns that back on)
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def pool_stats(eng) -> dict:
+    """Occupancy and checkout wait times of an engine's pool."""
+    pool = eng.pool
+    info = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        info.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        info.update(stats)
+        info["wait_ms_avg"] = stats["wait_ms_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+    return info
+
 
-# Create SQLAlchemy engine
+# Create SQLAlchemy engine (always available: Alembic and scripts use it)
 engine = create_engine(
     DATABASE_URL,
-    pool_pre_ping=True,  # test connection before using
-    future=True
+    future=True,
+    **_pool_options(False, DATABASE_URL),
 )
 
 # Session factory
@@ -18,13 +118,87 @@ SessionLocal = sessionmaker(
     future=True
 )
 
+# Async engine (DB_ASYNC=true): requests and the WebSocket manager talk to
+# Postgres through an asyncio driver instead of occupying threadpool slots
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **_pool_options(True, ASYNC_DATABASE_URL),
+) if DB_ASYNC else None
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,  # ORM objects are read after commit, outside the greenlet
+) if DB_ASYNC else None
+
+def db_stats() -> dict:
+    """Pool statistics of the engines this worker uses."""
+    stats = {"sync": pool_stats(engine)}
+    if async_engine is not None:
+        stats["async"] = pool_stats(async_engine.sync_engine)
+    return stats
+
 # Base class for models
 Base = declarative_base()
 
+DbSession = Union[Session, AsyncSession]
+
 # Dependency for FastAPI routes
-def get_db():
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+get_db = get_async_db if DB_ASYNC else get_sync_db
+
+
+async def run_db(db: DbSession, fn, *args, **kwargs):
+    """
+    Run a sync CRUD function `fn(session, *args, **kwargs)` without blocking
+    the event loop: natively over the async driver for an AsyncSession
+    (AsyncSession.run_sync), in the threadpool for a sync Session.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+async def run_in_session(fn, *args, **kwargs):
+    """Like run_db, with a short-lived session opened just for this call."""
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(fn, *args, **kwargs)
+
+    def _run():
+        with SessionLocal() as db:
+            return fn(db, *args, **kwargs)
+
+    return await run_in_threadpool(_run)
+
+
+async def stream_partitions(stmt, size: int = 1000):
+    """
+    Stream the ORM rows of a select in lists of up to `size`, through a
+    server-side cursor in a dedicated session, so memory stays constant
+    regardless of the result size.
+    """
+    stmt = stmt.execution_options(yield_per=size)
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(stmt)
+            async for part in result.scalars().partitions():
+                yield part
+        return
+
+    def _partitions():
+        with SessionLocal() as db:
+            yield from db.execute(stmt).scalars().partitions()
+
+    async for part in iterate_in_threadpool(_partitions()):
+        yield part
@@ -0,0 +1,82 @@
+# app/encoding.py
+from __future__ import annotations
+import json
+import uuid
+import zlib
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Tuple
+
+from fastapi.responses import JSONResponse
+
+from .config import JSON_ENCODER
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Fallback for types the encoders do not handle natively."""
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# ---------------- Encoders ---------------- #
+def _json_dumps(obj: Any) -> str:
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":"))
+
+
+def _orjson_dumps(obj: Any) -> str:
+    return orjson.dumps(obj, default=_default).decode()
+
+
+ENCODERS: Dict[str, Tuple[Callable[[Any], str], Callable[[Any], Any]]] = {
+    "json": (_json_dumps, json.loads),
+}
+if orjson is not None:
+    ENCODERS["orjson"] = (_orjson_dumps, orjson.loads)
+
+
+def _select(name: str) -> Tuple[Callable[[Any], str], Callable[[Any], Any]]:
+    if name == "auto":
+        return ENCODERS.get("orjson") or ENCODERS["json"]
+    if name not in ENCODERS:
+        raise ValueError(f"JSON encoder {name!r} is not available")
+    return ENCODERS[name]
+
+
+dumps, loads = _select(JSON_ENCODER)
+
+
+# ---------------- Responses ---------------- #
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the configured encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content).encode("utf-8")
+
+
+async def ndjson_stream(
+    batches: AsyncIterator[Iterable[Any]],
+    to_dict: Callable[[Any], dict],
+    gzip: bool = False,
+) -> AsyncIterator[bytes]:
+    """Encode batches of rows as NDJSON chunks, optionally gzip-compressed."""
+    compressor = zlib.compressobj(wbits=31) if gzip else None  # wbits=31: gzip container
+    async for batch in batches:
+        chunk = "".join(dumps(to_dict(row)) + "\n" for row in batch).encode("utf-8")
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+    if compressor is not None:
+        yield compressor.flush()
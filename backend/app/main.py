@@ -1,23 +1,24 @@
 from __future__ import annotations
 import uuid
 import os
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends
+from fastapi import FastAPI, HTTPException, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from alembic import command
-from alembic.config import Config
-from jose import JWTError
 
-from .db import get_db
+from .db import async_engine, db_stats, engine, run_in_session
+from . import encoding, metrics
+from .compression import CompressionMiddleware
+from .migrations import run_startup as run_startup_migrations
 from .routers.sessions import router as sessions_router
 from .routers import messages as messages_router
 from .auth.router import router as auth_router
 from .auth.users import router as user_router
-from .auth.utils import decode_token
+from .auth.cache import token_cache
+from .auth.deps import authenticate
+from .auth.hashing import password_hasher
 from .crud import sessions as crud_sessions
 from .ws.manager import manager
-from . import models
-from datetime import timedelta, datetime, timezone
+from .ws.streams import StreamError
+from .config import MIGRATE_ON_STARTUP, WS_RATE_ACTION, WS_RATE_CLOSE_CODE, WS_EPHEMERAL_EVENTS, WS_EVENT_MAX_BYTES
 
 app = FastAPI(title="Insurge AI Backend")
 
@@ -36,22 +37,89 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # -------------------- Alembic migrations --------------------
 def run_migrations():
-    alembic_cfg = Config("alembic.ini")
-    command.upgrade(alembic_cfg, "head")
+    # skips Alembic when the schema is already at head; see app/migrations.py
+    run_startup_migrations(MIGRATE_ON_STARTUP)
 
 @app.on_event("startup")
 def on_startup():
     run_migrations()
 
+@app.on_event("startup")
+async def start_ws_manager():
+    await manager.start()
+
+@app.on_event("shutdown")
+async def stop_ws_manager():
+    await manager.stop()
+
+@app.on_event("startup")
+def start_password_hasher():
+    password_hasher.start()
+
+@app.on_event("shutdown")
+def stop_password_hasher():
+    password_hasher.shutdown()
+
 # -------------------- Health check --------------------
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/internal/stats", include_in_schema=False)
+def internal_stats():
+    """This worker's WebSocket, cache, password hashing and connection pool counters."""
+    return {
+        "ws": manager.stats(),
+        "db": db_stats(),
+        "auth_cache": token_cache.info(),
+        "password_hasher": password_hasher.info(),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """This worker's metrics in the Prometheus text format."""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+# -------------------- Metrics --------------------
+metrics.instrument_engine(engine, "sync")
+if async_engine is not None:
+    metrics.instrument_engine(async_engine.sync_engine, "async")
+
+def _pool_gauge(key: str):
+    def _read():
+        return {(name,): stats.get(key, 0) for name, stats in db_stats().items()}
+    return _read
+
+metrics.registry.register(metrics.GaugeFunc(
+    "ws_connections", "Open WebSocket connections on this worker",
+    lambda: sum(len(conns) for conns in manager.active.values()),
+))
+metrics.registry.register(metrics.GaugeFunc(
+    "ws_sessions", "Sessions with at least one open WebSocket on this worker",
+    lambda: len(manager.active),
+))
+metrics.registry.register(metrics.GaugeFunc(
+    "ws_send_queue_depth", "Frames queued for sending across this worker's WebSockets",
+    lambda: sum(c.queue_depth for conns in manager.active.values() for c in conns.values()),
+))
+metrics.registry.register(metrics.GaugeFunc(
+    "password_hash_queue_waiting", "Password hashes waiting for a hashing slot on this worker",
+    lambda: password_hasher.waiting,
+))
+metrics.registry.register(metrics.GaugeFunc(
+    "db_pool_checked_out", "Connections checked out of the pool", _pool_gauge("checked_out"), labels=("engine",),
+))
+metrics.registry.register(metrics.GaugeFunc(
+    "db_pool_overflow", "Connections open beyond the pool size", _pool_gauge("overflow"), labels=("engine",),
+))
+
 # -------------------- Routers --------------------
 app.include_router(auth_router)
 app.include_router(user_router)
@@ -60,51 +128,99 @@ app.include_router(messages_router.router)
 
 # -------------------- WebSocket --------------------
 @app.websocket("/ws/sessions/{session_id}")
-async def session_ws(websocket: WebSocket, session_id: str, db: Session = Depends(get_db)):
+async def session_ws(websocket: WebSocket, session_id: str):
     token = websocket.query_params.get("token")
     if not token:
         await websocket.close(code=1008)
         return
 
-    try:
-        claims = decode_token(token)
-    except JWTError:
-        await websocket.close(code=1008)
-        return
-
-    user_id_str = claims.get("sub")
-    email = claims.get("email")
     try:
         sid = uuid.UUID(session_id)
-        uid = uuid.UUID(user_id_str)
+        # last message seq the client has seen, to resume after a reconnect
+        since = websocket.query_params.get("since")
+        since = int(since) if since is not None else None
     except Exception:
         await websocket.close(code=1003)  # unsupported data / bad IDs
         return
 
-    user = db.query(models.User).filter(
-        models.User.id == uid, models.User.email == email
-    ).first()
-    if not user:
-        await websocket.close(code=1008)
-        return
-
-    # ✅ Allow owner or any participant
-    session_exists = db.query(models.ChatSession).filter(models.ChatSession.id == sid).first()
-    if not session_exists:
+    # Verified tokens are cached, so reconnect storms skip the JWT check and user lookup
+    try:
+        user = await authenticate(token)
+    except HTTPException:
         await websocket.close(code=1008)
         return
 
-    if not crud_sessions.is_participant(db, sid, uid):
+    # ✅ Allow owner or any participant (one query, off the event loop)
+    if not await run_in_session(crud_sessions.is_participant, sid, user.id):
         await websocket.close(code=1008)
         return
 
-    await manager.connect(sid, websocket)
+    await manager.connect(sid, websocket, user_id=user.id, since=since)
+    bucket = manager.rate_limiter.connection_bucket()
+    stream_bucket = manager.rate_limiter.connection_bucket("stream")
     try:
         while True:
             data = await websocket.receive_json()
-            role = data.get("role", "user")
+            kind = data.get("type")
+
+            # Every inbound frame is rate limited; stream deltas have their own bucket
+            if kind == "stream_delta":
+                admitted = manager.rate_limiter.allow_stream(stream_bucket)
+            else:
+                admitted = manager.rate_limiter.allow(bucket, user.id, sid)
+            if not admitted:
+                if WS_RATE_ACTION == "close":
+                    await websocket.close(code=WS_RATE_CLOSE_CODE)
+                    await manager.disconnect(sid, websocket)
+                    return
+                manager.send_personal(sid, websocket, {
+                    "type": "error",
+                    "code": "rate_limited",
+                    "role": "system",
+                    "content": "You are sending too fast; this frame was dropped.",
+                })
+                continue
+
+            # Ephemeral events (typing, cursor hints, ...) are broadcast only, never saved
+            if kind == "event":
+                if data.get("event") not in WS_EPHEMERAL_EVENTS:
+                    continue
+                # relayed to every participant: keep it small
+                if len(encoding.dumps(data.get("data")).encode()) > WS_EVENT_MAX_BYTES:
+                    manager.send_personal(sid, websocket, {
+                        "type": "error",
+                        "code": "event_too_large",
+                        "role": "system",
+                        "content": f"Event data is limited to {WS_EVENT_MAX_BYTES} bytes.",
+                    })
+                    continue
+                manager.publish_event(sid, user.id, data["event"], data.get("data"))
+                continue
+
+            # Read receipts: {"type": "read", "seq": <last seq read>}
+            if kind == "read":
+                seq = data.get("seq")
+                if isinstance(seq, int) and not isinstance(seq, bool) and seq > 0:
+                    manager.mark_read(sid, user.id, seq)
+                continue
+
+            # Streamed messages: stream_start, then stream_delta frames (broadcast,
+            # never stored), then stream_end / stream_abort saves one message
+            if kind in ("stream_delta", "stream_end", "stream_abort"):
+                try:
+                    if kind == "stream_delta":
+                        await manager.stream_delta(websocket, data.get("id"), data.get("delta"))
+                    else:
+                        await manager.stream_end(websocket, data.get("id"), aborted=kind == "stream_abort")
+                except StreamError as e:
+                    manager.send_personal(sid, websocket, {
+                        "type": "error", "code": e.code, "role": "system", "content": str(e), "id": data.get("id"),
+                    })
+                continue
+
+            role = data.get("role", "agent" if kind == "stream_start" else "user")
             content = data.get("content", "")
-            if not content:
+            if not content and kind != "stream_start":
                 continue
 
             from .models import MessageRole
@@ -112,21 +228,24 @@ async def session_ws(websocket: WebSocket, session_id: str, db: Session = Depend
             allowed = {"user", "agent", "system", "tool"}
             r = MessageRole(role) if role in allowed else MessageRole.user
 
-            await manager.save_message(
+            if kind == "stream_start":
+                try:
+                    await manager.stream_start(
+                        sid, websocket, user.id if r == MessageRole.user else None, user.email, r, data.get("ref"),
+                    )
+                except StreamError as e:
+                    manager.send_personal(sid, websocket, {
+                        "type": "error", "code": e.code, "role": "system", "content": str(e), "ref": data.get("ref"),
+                    })
+                continue
+
+            # Broadcast once committed: the frame carries the row id and seq
+            await manager.post_message(
                 sid,
                 user_id=user.id if r == MessageRole.user else None,
                 role=r,
                 content=content,
-            )
-            await manager.broadcast(
-                sid,
-                {
-                    "role": r.value,
-                    "content": content,
-                    "user_id": str(user.id) if r == MessageRole.user else None,
-                    "username": user.username if r == MessageRole.user else None,
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                }
+                username=user.email,
             )
 
     except WebSocketDisconnect:
@@ -0,0 +1,259 @@
+# app/metrics.py
+"""
+Per-worker metrics in the Prometheus text format, served at /metrics.
+Each worker keeps its own values; scrape every worker (they are labelled
+by pid) and aggregate in Prometheus.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+from sqlalchemy import event
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()  # sync routes and SQL events run in threads
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def _label_str(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{self._label_str(k)} {_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (+Inf last)], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][i] += 1
+            entry[1][0] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        """Context manager observing the duration of its block, in seconds."""
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._values.items()]
+        lines = self._header()
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_num(bound)}"'
+                lines.append(f"{self.name}_bucket{self._label_str(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(labels)} {_num(total)}")
+            lines.append(f"{self.name}_count{self._label_str(labels)} {cumulative}")
+        return lines
+
+
+class GaugeFunc(_Metric):
+    """Gauge read from a callback at scrape time: a number, or {label values: number}."""
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Union[float, Dict[LabelValues, float]]],
+        labels: Iterable[str] = (),
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        value = self.fn()
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        return self._header() + [f"{self.name}{self._label_str(k)} {_num(v)}" for k, v in items]
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: LabelValues) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = ["# TYPE process_info gauge", f'process_info{{pid="{os.getpid()}"}} 1']
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+registry = Registry()
+
+# -------------------------
+# Metrics
+# -------------------------
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    labels=("method", "route", "status"),
+))
+WS_BROADCAST_RECIPIENTS = registry.register(Histogram(
+    "ws_broadcast_recipients", "Local sockets a broadcast frame was queued for",
+    buckets=SIZE_BUCKETS,
+))
+WS_FANOUT_SECONDS = registry.register(Histogram(
+    "ws_fanout_duration_seconds", "Time to queue a broadcast frame for every local socket of a session",
+))
+WS_PUBLISH_SECONDS = registry.register(Histogram(
+    "ws_publish_duration_seconds", "Time to hand a broadcast to the broker",
+))
+WS_THROTTLED_FRAMES = registry.register(Counter(
+    "ws_throttled_frames_total", "Inbound WebSocket frames rejected by the rate limiter, by the scope that ran out",
+    labels=("scope",),
+))
+MESSAGE_SAVE_SECONDS = registry.register(Histogram(
+    "message_save_duration_seconds", "WebSocket message save latency, from queued to committed",
+))
+MESSAGE_BATCH_ROWS = registry.register(Histogram(
+    "message_write_batch_rows", "Rows per write-behind message batch", buckets=SIZE_BUCKETS,
+))
+PASSWORD_HASH_SECONDS = registry.register(Histogram(
+    "password_hash_duration_seconds", "bcrypt time per hash or verify, excluding the queue wait",
+    labels=("operation",),
+))
+DB_QUERY_SECONDS = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time", labels=("engine",),
+))
+DB_QUERY_ERRORS = registry.register(Counter(
+    "db_query_errors_total", "SQL statements that raised", labels=("engine",),
+))
+COMPRESSION_IN_BYTES = registry.register(Counter(
+    "compression_input_bytes_total", "Bytes handed to a compressor", labels=("transport", "encoding"),
+))
+COMPRESSION_OUT_BYTES = registry.register(Counter(
+    "compression_output_bytes_total", "Compressed bytes sent", labels=("transport", "encoding"),
+))
+COMPRESSION_CPU_SECONDS = registry.register(Counter(
+    "compression_cpu_seconds_total", "Thread CPU time spent compressing", labels=("transport", "encoding"),
+))
+COMPRESSION_SKIPPED = registry.register(Counter(
+    "compression_skipped_total", "Responses / messages sent uncompressed though the client accepts it",
+    labels=("transport", "reason"),
+))
+
+
+# -------------------------
+# Instrumentation
+# -------------------------
+
+def instrument_engine(engine, name: str) -> None:
+    """Time every statement run on a (sync) Engine through cursor events."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERY_SECONDS.observe(time.perf_counter() - conn.info["_query_start"].pop(), name)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        starts = conn.info.get("_query_start") if conn is not None else None
+        if starts:
+            starts.pop()
+        DB_QUERY_ERRORS.inc(name)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording HTTP latency per matched route template."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                getattr(route, "path", "<unmatched>"),
+                str(status["code"]),
+            )
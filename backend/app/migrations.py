@@ -0,0 +1,129 @@
+# app/migrations.py
+"""
+Schema migrations at startup and out of band.
+
+    python -m app.migrations upgrade   # migrate to head (deploy step)
+    python -m app.migrations check     # exit 1 unless the schema is at head
+    python -m app.migrations current   # print the database revision(s)
+"""
+from __future__ import annotations
+import argparse
+import functools
+import logging
+import os
+import sys
+from typing import FrozenSet, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+from .db import engine
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+# pg_advisory_lock key serializing migrations across workers and deploys
+MIGRATION_LOCK_KEY = 0x636861745F6D6967  # "chat_mig"
+
+
+def _alembic_config():
+    from alembic.config import Config
+    cfg = Config(ALEMBIC_INI)
+    cfg.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "alembic"))
+    return cfg
+
+
+@functools.lru_cache(maxsize=None)
+def head_revisions() -> FrozenSet[str]:
+    """
+    Head revision(s) of the migration scripts (reads the files, no database).
+    Scanned once per process, and only by the paths that compare revisions.
+    """
+    from alembic.script import ScriptDirectory
+    return frozenset(ScriptDirectory.from_config(_alembic_config()).get_heads())
+
+
+def current_revisions(conn: Connection) -> Set[str]:
+    """Revision(s) stamped in the database; empty before the first migration."""
+    try:
+        with conn.begin():
+            return {row[0] for row in conn.execute(text("SELECT version_num FROM alembic_version"))}
+    except DBAPIError:
+        return set()  # no alembic_version table yet
+
+
+def upgrade(heads: Optional[Set[str]] = None) -> bool:
+    """
+    Migrate to head unless the database is already there. Workers starting
+    together take a Postgres advisory lock: the first one migrates, the
+    others wait for it and then find nothing to do. Returns True if
+    Alembic ran.
+    """
+    heads = heads if heads is not None else head_revisions()
+    is_postgres = engine.dialect.name == "postgresql"
+
+    # autocommit: the lock connection must not hold a snapshot that a
+    # CREATE INDEX CONCURRENTLY in a migration would wait on
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if current_revisions(conn) == heads:
+            return False
+
+        if is_postgres:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            # another worker may have finished while we waited for the lock
+            if current_revisions(conn) == heads:
+                return False
+            from alembic import command
+            logger.info("Migrating database to %s", ", ".join(sorted(heads)))
+            command.upgrade(_alembic_config(), "head")
+            return True
+        finally:
+            if is_postgres:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def is_current(heads: Optional[Set[str]] = None) -> bool:
+    """One query: is the database stamped with the script head(s)?"""
+    heads = heads if heads is not None else head_revisions()
+    with engine.connect() as conn:
+        return current_revisions(conn) == heads
+
+
+def run_startup(mode: str) -> None:
+    """
+    Startup hook. "upgrade" migrates (see upgrade()), "check" refuses to
+    start on an out-of-date schema, "off" does nothing (migrations are run
+    out of band with `python -m app.migrations upgrade`).
+    """
+    if mode == "off":
+        return
+    if mode == "check":
+        if not is_current():
+            raise RuntimeError("Database schema is not at head; run `python -m app.migrations upgrade`")
+        return
+    upgrade()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.migrations", description="Database migrations")
+    parser.add_argument("action", choices=["upgrade", "check", "current"])
+    args = parser.parse_args(argv)
+
+    if args.action == "upgrade":
+        print("migrated" if upgrade() else "already at head")
+        return 0
+    with engine.connect() as conn:
+        current = current_revisions(conn)
+    if args.action == "current":
+        print(", ".join(sorted(current)) or "(none)")
+        return 0
+    heads = head_revisions()
+    print(f"database: {', '.join(sorted(current)) or '(none)'}  head: {', '.join(sorted(heads))}")
+    return 0 if current == heads else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
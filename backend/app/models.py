@@ -6,9 +6,9 @@ from typing import List, Optional
 
 from sqlalchemy import (
     String, Text, ForeignKey, DateTime, func, Enum, Index,
-    UniqueConstraint, Boolean
+    UniqueConstraint, Boolean, BigInteger, Integer
 )
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .db import Base
@@ -65,6 +65,16 @@ class ChatSession(Base):
         DateTime(timezone=True), server_default=func.now(),
         onupdate=func.now(), nullable=False
     )
+    # last per-session message sequence number handed out
+    last_seq: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0, server_default="0"
+    )
+    # inbox: kept current by crud.messages.allocate_seq on every insert
+    last_message_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_message_preview: Mapped[Optional[str]] = mapped_column(String(200))
+    last_activity_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
 
     owner: Mapped["User"] = relationship(back_populates="sessions")
     messages: Mapped[List["Message"]] = relationship(
@@ -81,8 +91,14 @@ class ChatSession(Base):
 
     __table_args__ = (
         Index("ix_chat_sessions_user_created", "user_id", "created_at"),
+        Index("ix_chat_sessions_user_activity", "user_id", "last_activity_at"),
     )
 
+    @property
+    def message_count(self) -> int:
+        # seqs are gap-free and messages are never deleted individually
+        return self.last_seq
+
 
 # ---------------------- PARTICIPANTS ----------------------
 class ChatSessionParticipant(Base):
@@ -102,10 +118,18 @@ class ChatSessionParticipant(Base):
     joined_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
+    # seq of the last message this participant has read
+    last_read_seq: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0, server_default="0"
+    )
 
     session: Mapped["ChatSession"] = relationship(back_populates="participants")
     user: Mapped["User"] = relationship(back_populates="participant_sessions")
 
+    __table_args__ = (
+        Index("ix_chat_session_participants_user", "user_id"),
+    )
+
 
 # ---------------------- INVITES ----------------------
 class ChatInvite(Base):
@@ -176,6 +200,8 @@ class Message(Base):
         Enum(MessageRole, name="message_role_enum"), nullable=False, index=True
     )
     content: Mapped[str] = mapped_column(Text, nullable=False)
+    # position within the session (1, 2, 3, ...), allocated from ChatSession.last_seq
+    seq: Mapped[int] = mapped_column(BigInteger, nullable=False)
 
     tool_calls: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
     tool_metadata: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)  # renamed from metadata
@@ -183,10 +209,38 @@ class Message(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
+    # full-text document (text, then the tools called), kept current by the
+    # messages_search_vector trigger (migration 7c2e8f41b9d3); never loaded unless asked for
+    search_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR, nullable=True, deferred=True)
 
     session: Mapped["ChatSession"] = relationship(back_populates="messages")
     user: Mapped[Optional["User"]] = relationship(back_populates="messages")
 
     __table_args__ = (
         Index("ix_messages_session_created", "session_id", "created_at"),
+        Index("ix_messages_session_seq", "session_id", "seq", unique=True),
+        Index("ix_messages_search", "search_vector", postgresql_using="gin"),
+    )
+
+
+# ---------------------- MESSAGE PAYLOADS ----------------------
+class MessagePayload(Base):
+    """
+    Large tool_calls items and tool_metadata, stored out of line and
+    content-addressed per session: messages keep a
+    {"$ref": "sha256:<hash>", "size": n} stub instead, identical payloads
+    in a session are stored once, and they are deleted with the session.
+    """
+    __tablename__ = "message_payloads"
+
+    session_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("chat_sessions.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 of the canonical JSON
+    data: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)  # bytes of the canonical JSON
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
     )
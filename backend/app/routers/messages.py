@@ -1,18 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
 from sqlalchemy.orm import Session
+import logging
 import uuid
-from typing import List
-from ..db import get_db
+from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from ..db import DbSession, get_db, run_db, stream_partitions
 from .. import models
 from ..crud import messages as crud_messages
 from ..crud import sessions as crud_sessions
-from ..schemas import MessageCreate, MessageOut
-from ..auth.deps import get_current_user
+from ..config import BULK_INGEST_MAX_MESSAGES
+from ..schemas import BulkIngestOut, MessageCreate, MessageOut, MessageToolsOut
+from ..encoding import FastJSONResponse, ndjson_stream
+from ..auth.deps import AuthUser, get_current_user
+from ..ws.manager import manager
+
+logger = logging.getLogger(__name__)
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+_message_list = TypeAdapter(List[MessageCreate])
+TOOL_FIELDS = ("tool_calls", "tool_metadata")
 
 router = APIRouter(prefix="/sessions/{session_id}/messages", tags=["messages"])
 
 
-def _require_participant(db: Session, session_id: uuid.UUID, user_id: uuid.UUID) -> models.ChatSession:
+def _check_participant(db: Session, session_id: uuid.UUID, user_id: uuid.UUID) -> models.ChatSession:
     """Ensure that the given user is a participant in the chat session."""
     session = db.query(models.ChatSession).filter(models.ChatSession.id == session_id).first()
     if not session:
@@ -21,31 +34,206 @@ def _require_participant(db: Session, session_id: uuid.UUID, user_id: uuid.UUID)
         raise HTTPException(status_code=403, detail="Not a participant")
     return session
 
-@router.get("", response_model=List[MessageOut])
-def get_messages(
+async def _require_participant(db: DbSession, session_id: uuid.UUID, user_id: uuid.UUID) -> models.ChatSession:
+    return await run_db(db, _check_participant, session_id, user_id)
+
+def _projection(fields: Optional[str], include_tools: bool) -> Optional[List[str]]:
+    """MessageOut fields to return, or None for all of them."""
+    if fields is None:
+        if include_tools:
+            return None
+        return [f for f in MessageOut.model_fields if f not in TOOL_FIELDS]
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(selected) - set(MessageOut.model_fields))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if not include_tools:
+        selected = [f for f in selected if f not in TOOL_FIELDS]
+    return ["id"] + [f for f in dict.fromkeys(selected) if f != "id"]
+
+def _project(message, names: List[str]) -> dict:
+    if isinstance(message, dict):  # hot-tail cache entries are message frames
+        return {name: message.get(name) for name in names}
+    return {name: getattr(message, name) for name in names}
+
+@router.get("", response_model=List[MessageOut], response_class=FastJSONResponse)
+async def get_messages(
     session_id: uuid.UUID,
-    order_desc: bool = Query(False, description="Sort messages in descending order by creation time"),
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    response: Response,
+    order_desc: bool = Query(False, description="Sort messages newest first (by seq)"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of messages to return"),
+    before: Optional[str] = Query(None, description="Cursor: return messages older than this one"),
+    after: Optional[str] = Query(None, description="Cursor: return messages newer than this one"),
+    fields: Optional[str] = Query(None, description="Comma-separated message fields to return; id is always included"),
+    include_tools: bool = Query(True, description="Include tool_calls and tool_metadata"),
+    db: DbSession = Depends(get_db),
+    user: AuthUser = Depends(get_current_user),
 ):
-    _require_participant(db, session_id, user.id)
-    return crud_messages.list_messages_all(db, session_id=session_id, order_desc=order_desc)
+    """
+    Page through a session's messages. Without a cursor the newest `limit`
+    messages are returned; the X-Next-Cursor header, when present, fetches
+    the next page (older ones, or newer ones when paging with `after`).
+    `fields` / `include_tools=false` trim each message; large tool payloads
+    are references either way, loaded from GET .../{message_id}/tools.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+    names = _projection(fields, include_tools)
+    await _require_participant(db, session_id, user.id)
+    page = None
+    if before is None and after is None:
+        # tail of a session with live sockets: served from the hot-tail cache
+        page = await manager.message_tail(session_id, limit, order_desc)
+    if page is None:
+        try:
+            page = await run_db(
+                db,
+                crud_messages.list_messages_page,
+                session_id=session_id,
+                limit=limit,
+                before=before,
+                after=after,
+                order_desc=order_desc,
+                include_tools=names is None or any(f in names for f in TOOL_FIELDS),
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    messages, next_cursor = page
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if names is not None:
+        # bypasses response_model, which would fill the missing fields back in
+        return FastJSONResponse([_project(m, names) for m in messages], headers=headers)
+    response.headers.update(headers)
+    return messages
+
+@router.get("/{message_id}/tools", response_model=MessageToolsOut, response_class=FastJSONResponse)
+async def get_message_tools(
+    session_id: uuid.UUID,
+    message_id: uuid.UUID,
+    db: DbSession = Depends(get_db),
+    user: AuthUser = Depends(get_current_user),
+):
+    """A message's tool calls and metadata with every out-of-line payload loaded."""
+    await _require_participant(db, session_id, user.id)
+    tools = await run_db(db, crud_messages.get_message_tools, session_id, message_id)
+    if tools is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return tools
+
+@router.get("/export")
+async def export_messages(
+    session_id: uuid.UUID,
+    gzip: bool = Query(False, description="Download a .ndjson.gz file (application/gzip) instead of NDJSON"),
+    db: DbSession = Depends(get_db),
+    user: AuthUser = Depends(get_current_user),
+):
+    """Stream the full session transcript as NDJSON, one message per line."""
+    await _require_participant(db, session_id, user.id)
+    return export_response(crud_messages.export_query(session_id=session_id), f"session-{session_id}", gzip)
+
+def export_response(stmt, name: str, gzip: bool) -> StreamingResponse:
+    """
+    NDJSON download streamed from a server-side cursor. With `gzip` the body
+    is a .ndjson.gz file, compressed here; its application/gzip type keeps
+    CompressionMiddleware off it. Plain NDJSON is compressed by the
+    middleware per Accept-Encoding, like other responses.
+    """
+    body = ndjson_stream(stream_partitions(stmt), crud_messages.export_row, gzip=gzip)
+    filename = f"{name}.ndjson.gz" if gzip else f"{name}.ndjson"
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @router.post("", response_model=MessageOut, status_code=status.HTTP_201_CREATED)
-def post_message(
+async def post_message(
     session_id: uuid.UUID,
     payload: MessageCreate,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
+    user: AuthUser = Depends(get_current_user),
 ):
-    _require_participant(db, session_id, user.id)
-    return crud_messages.create_message(
+    await _require_participant(db, session_id, user.id)
+    username = user.email if payload.role == "user" else None
+    published = manager.broker.transactional
+
+    def _publish_in(tx: Session, message: models.Message):
+        # from the insert's transaction, so workers see it in seq order
+        manager.publish_saved_in(tx, crud_messages.export_row(message), username)
+
+    message = await run_db(
         db,
+        crud_messages.create_message,
         session_id=session_id,
         user_id=user.id if payload.role == "user" else None,
         role=payload.role,
         content=payload.content,
         tool_calls=[t.dict() for t in payload.tool_calls] if payload.tool_calls else None,
         tool_metadata=payload.tool_metadata,
+        before_commit=_publish_in if published else None,
     )
+    # live clients (and their workers' hot-tail caches) see it like a socket message
+    try:
+        await manager.publish_saved(crud_messages.export_row(message), username, published=published)
+    except Exception:
+        logger.warning("Failed to broadcast message %s", message.id, exc_info=True)
+    return message
 
+
+async def _read_bulk_items(request: Request) -> List[dict]:
+    """Validate a JSON array or NDJSON body of MessageCreate items."""
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_TYPES:
+        items = []
+        for line_no, line in enumerate(body.splitlines()):
+            if not line.strip():
+                continue
+            try:
+                items.append(MessageCreate.model_validate_json(line))
+            except ValidationError as e:
+                raise RequestValidationError([{**err, "loc": ("body", line_no, *err["loc"])} for err in e.errors()])
+    else:
+        try:
+            items = _message_list.validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors()])
+    if not items:
+        raise HTTPException(status_code=400, detail="No messages")
+    if len(items) > BULK_INGEST_MAX_MESSAGES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {BULK_INGEST_MAX_MESSAGES} messages per request",
+        )
+    return [item.model_dump(mode="json") for item in items]
+
+@router.post(
+    "/bulk",
+    response_model=BulkIngestOut,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/MessageCreate"}}},
+        "application/x-ndjson": {"schema": {"type": "string"}},
+    }}},
+)
+async def bulk_post_messages(
+    session_id: uuid.UUID,
+    request: Request,
+    broadcast: bool = Query(True, description="Send live clients one summary frame for the batch"),
+    db: DbSession = Depends(get_db),
+    user: AuthUser = Depends(get_current_user),
+):
+    """
+    Import an ordered transcript: a JSON array of messages, or NDJSON with
+    one message per line. All of them are stored in one transaction, in
+    order, or none are.
+    """
+    await _require_participant(db, session_id, user.id)
+    items = await _read_bulk_items(request)
+    summary = await run_db(db, crud_messages.bulk_create_messages, session_id, user.id, items)
+    try:
+        author = user.id if any(item["role"] == "user" for item in items) else None
+        await manager.publish_bulk(summary, author, notify=broadcast)
+    except Exception:
+        logger.warning("Failed to announce bulk insert into session %s", session_id, exc_info=True)
+    return summary
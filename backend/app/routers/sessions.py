@@ -1,27 +1,30 @@
 # app/routers/sessions.py
 from __future__ import annotations
 import uuid
-from datetime import datetime, timezone
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 
-from ..db import get_db
+from ..db import DbSession, get_db, run_db
 from .. import models
 from ..schemas import (
     ChatSessionCreate, ChatSessionOut, ChatSessionUpdate,
     InviteCreate, InviteOut, InviteAcceptRequest, SessionParticipantOut,
-    SessionParticipantCreate
+    SessionParticipantCreate, MessageSearchResult, InboxSessionOut,
+    ReadCursorUpdate, ReadStateOut
 )
-from ..auth.deps import get_current_user
+from ..auth.deps import AuthUser, get_current_user
 from ..crud import sessions as crud_sessions
+from ..crud import messages as crud_messages
+from ..ws.manager import manager
+from .messages import export_response
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
 
 # --- utils ---
-def _require_participant(db: Session, session_id: uuid.UUID, user_id: uuid.UUID) -> models.ChatSession:
+def _check_participant(db: Session, session_id: uuid.UUID, user_id: uuid.UUID) -> models.ChatSession:
     session = db.query(models.ChatSession).filter(models.ChatSession.id == session_id).first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -30,16 +33,19 @@ def _require_participant(db: Session, session_id: uuid.UUID, user_id: uuid.UUID)
     return session
 
 
+async def _require_participant(db: DbSession, session_id: uuid.UUID, user_id: uuid.UUID) -> models.ChatSession:
+    return await run_db(db, _check_participant, session_id, user_id)
+
+
 # --- create session (owner is also participant) ---
 # @router.post("", response_model=ChatSessionOut, status_code=status.HTTP_201_CREATED)
 @router.post("/", response_model=ChatSessionOut, status_code=status.HTTP_201_CREATED)
-def create_session(
+async def create_session(
     payload: ChatSessionCreate,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
+    user: AuthUser = Depends(get_current_user),
 ):
-    chat_session = crud_sessions.create_session(db, user_id=user.id, title=payload.title)
-    # crud_sessions.add_owner_as_participant(db, chat_session.id, user.id)
+    chat_session = await run_db(db, crud_sessions.create_session, user_id=user.id, title=payload.title)
     return chat_session
 
 
@@ -47,21 +53,76 @@ def create_session(
 # --- list my sessions ---
 @router.get("", response_model=List[ChatSessionOut])
 @router.get("/", response_model=List[ChatSessionOut])
-def list_my_sessions(
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+async def list_my_sessions(
+    db: DbSession = Depends(get_db),
+    user: AuthUser = Depends(get_current_user),
 ):
-    return crud_sessions.list_sessions_for_user(db, user.id)
+    return await run_db(db, crud_sessions.list_sessions_for_user, user.id)
+
+
+# --- inbox: my sessions by last activity, with previews ---
+@router.get("/inbox", response_model=List[InboxSessionOut])
+async def get_inbox(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = Query(None, description="Cursor from X-Next-Cursor: sessions less recently active"),
+    db: DbSession = Depends(get_db),
+    user: AuthUser = Depends(get_current_user),
+):
+    """
+    Sessions I own or joined, most recently active first, each with its
+    last message preview, time and message count. Paged by X-Next-Cursor.
+    """
+    try:
+        sessions, next_cursor = await run_db(db, crud_sessions.list_inbox, user.id, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return sessions
+
+
+# --- export all my sessions ---
+@router.get("/me/export")
+async def export_my_sessions(
+    gzip: bool = Query(False, description="Download a .ndjson.gz file (application/gzip) instead of NDJSON"),
+    user: AuthUser = Depends(get_current_user),
+):
+    """Stream every message of every session I own or joined as NDJSON."""
+    return export_response(crud_messages.export_query(user_id=user.id), f"user-{user.id}", gzip)
+
+
+# --- search my messages ---
+@router.get("/me/search", response_model=List[MessageSearchResult])
+async def search_my_messages(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=256, description='Search terms; supports "phrases", -word and OR'),
+    session_id: Optional[uuid.UUID] = Query(None, description="Only search this session"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    db: DbSession = Depends(get_db),
+    user: AuthUser = Depends(get_current_user),
+):
+    """
+    Full-text search over messages (and tool names) in sessions I own or
+    joined, ranked by relevance. X-Next-Offset is set when there may be more.
+    """
+    results = await run_db(
+        db, crud_messages.search_messages, user.id, q, limit, offset, session_id=session_id,
+    )
+    if len(results) == limit and offset + limit <= 1000:
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return results
 
 
 # --- get a session ---
 @router.get("/{session_id}", response_model=ChatSessionOut)
-def get_session(
+async def get_session(
     session_id: uuid.UUID,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
+    user: AuthUser = Depends(get_current_user),
 ):
-    chat_session = crud_sessions.get_session(db, session_id=session_id, user_id=user.id)
+    chat_session = await run_db(db, crud_sessions.get_session, session_id=session_id, user_id=user.id)
     if not chat_session:
         raise HTTPException(status_code=404, detail="Session not found")
     return chat_session
@@ -69,31 +130,32 @@ def get_session(
 
 # --- update session ---
 @router.put("/{session_id}", response_model=ChatSessionOut)
-def update_session(
+async def update_session(
     session_id: uuid.UUID,
     payload: ChatSessionUpdate,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
+    user: AuthUser = Depends(get_current_user),
 ):
-    chat_session = crud_sessions.get_session(db, session_id=session_id, user_id=user.id)
+    chat_session = await run_db(db, crud_sessions.get_session, session_id=session_id, user_id=user.id)
     if not chat_session:
         raise HTTPException(status_code=404, detail="Session not found")
     if payload.title:
-        chat_session = crud_sessions.update_session(db, chat_session, title=payload.title)
+        chat_session = await run_db(db, crud_sessions.update_session, chat_session, title=payload.title)
     return chat_session
 
 
 # --- delete session ---
 @router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_session(
+async def delete_session(
     session_id: uuid.UUID,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
+    user: AuthUser = Depends(get_current_user),
 ):
-    chat_session = crud_sessions.get_session(db, session_id=session_id, user_id=user.id)
+    chat_session = await run_db(db, crud_sessions.get_session, session_id=session_id, user_id=user.id)
     if not chat_session:
         raise HTTPException(status_code=404, detail="Session not found")
-    crud_sessions.delete_session(db, chat_session)
+    await run_db(db, crud_sessions.delete_session, chat_session)
+    await manager.reset_tail(session_id)
     return
 
 # ------------------------------------------------------------
@@ -101,22 +163,23 @@ def delete_session(
 # ------------------------------------------------------------
 
 @router.post("/{session_id}/invites", response_model=InviteOut)
-def create_session_invite(
+async def create_session_invite(
     session_id: uuid.UUID,
     payload: InviteCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user),
 ):
-    if not crud_sessions.is_participant(db, session_id, current_user.id):
+    if not await run_db(db, crud_sessions.is_participant, session_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized to invite")
 
     # 🔹 Ensure invitee email belongs to an existing user
-    invitee = crud_sessions.get_user_by_email(db, payload.email)
+    invitee = await run_db(db, crud_sessions.get_user_by_email, payload.email)
     if not invitee:
         raise HTTPException(status_code=400, detail="Invalid email: no such user")
 
-    inv = crud_sessions.create_invite(
-        db=db,
+    inv = await run_db(
+        db,
+        crud_sessions.create_invite,
         session_id=session_id,
         email=payload.email,
         created_by=current_user.id,
@@ -128,42 +191,42 @@ def create_session_invite(
 
 
 @router.get("/me/invites", response_model=List[InviteOut])
-def list_my_invites(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+async def list_my_invites(
+    db: DbSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user),
 ):
     """Get all pending invites for the logged-in user."""
-    return crud_sessions.list_user_invites(db, current_user.email)
+    return await run_db(db, crud_sessions.list_user_invites, current_user.email)
 
 
 @router.post("/invites/accept", response_model=InviteOut)
-def accept_session_invite(
+async def accept_session_invite(
     payload: InviteAcceptRequest,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user),
 ):
-    invite = crud_sessions.get_invite_by_token(db, payload.token)
+    invite = await run_db(db, crud_sessions.get_invite_by_token, payload.token)
     if not invite:
         raise HTTPException(status_code=404, detail="Invite not found")
 
     try:
-        accepted = crud_sessions.accept_invite(db, invite, current_user.id)
+        accepted = await run_db(db, crud_sessions.accept_invite, invite, current_user.id)
         return accepted
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/{session_id}/invites/{invite_id}/revoke", response_model=InviteOut)
-def revoke_session_invite(
+async def revoke_session_invite(
     session_id: uuid.UUID,
     invite_id: uuid.UUID,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user),
 ):
-    if not crud_sessions.is_participant(db, session_id, current_user.id):
+    if not await run_db(db, crud_sessions.is_participant, session_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized to revoke invite")
 
-    inv = crud_sessions.revoke_invite(db, invite_id, session_id)
+    inv = await run_db(db, crud_sessions.revoke_invite, invite_id, session_id)
     if not inv:
         raise HTTPException(status_code=404, detail="Invite not found")
     return inv
@@ -173,27 +236,67 @@ def revoke_session_invite(
 # ------------------------------------------------------------
 
 @router.get("/{session_id}/participants", response_model=List[SessionParticipantOut])
-def get_participants(
+async def get_participants(
     session_id: uuid.UUID,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user),
 ):
-    if not crud_sessions.is_participant(db, session_id, current_user.id):
+    if not await run_db(db, crud_sessions.is_participant, session_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized to view participants")
-    return crud_sessions.list_participants(db, session_id)
+    return await run_db(db, crud_sessions.list_participants, session_id)
+
+
+# --- read cursor ---
+async def _read_state(db: DbSession, session_id: uuid.UUID, user_id: uuid.UUID) -> ReadStateOut:
+    state = await run_db(db, crud_sessions.get_read_state, session_id, user_id)
+    if state is None:
+        raise HTTPException(status_code=403, detail="Not a participant")
+    last_read_seq, last_seq = state
+    # include an update that is still waiting to be written
+    last_read_seq = max(last_read_seq, min(manager.reads.pending(session_id, user_id), last_seq))
+    return ReadStateOut(
+        last_read_seq=last_read_seq, last_seq=last_seq, unread_count=max(last_seq - last_read_seq, 0),
+    )
+
+
+@router.get("/{session_id}/read", response_model=ReadStateOut)
+async def get_read_cursor(
+    session_id: uuid.UUID,
+    db: DbSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user),
+):
+    """My read cursor in the session and how many messages are unread."""
+    return await _read_state(db, session_id, current_user.id)
+
+
+@router.put("/{session_id}/read", response_model=ReadStateOut)
+async def update_read_cursor(
+    session_id: uuid.UUID,
+    payload: ReadCursorUpdate,
+    db: DbSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user),
+):
+    """Mark the session read up to `seq`; cursors only move forward."""
+    state = await _read_state(db, session_id, current_user.id)
+    seq = min(payload.seq, state.last_seq)
+    if seq > state.last_read_seq:
+        manager.mark_read(session_id, current_user.id, seq)
+        state.last_read_seq = seq
+        state.unread_count = state.last_seq - seq
+    return state
 
 
 @router.post("/{session_id}/participants", response_model=SessionParticipantOut)
-def add_session_participant(
+async def add_session_participant(
     session_id: uuid.UUID,
     payload: SessionParticipantCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
+    current_user: AuthUser = Depends(get_current_user),
 ):
-    if not crud_sessions.is_participant(db, session_id, current_user.id):
+    if not await run_db(db, crud_sessions.is_participant, session_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized to add participants")
 
-    participant = crud_sessions.add_participant(
-        db, session_id, payload.user_id, payload.role
+    participant = await run_db(
+        db, crud_sessions.add_participant, session_id, payload.user_id, payload.role
     )
     return participant
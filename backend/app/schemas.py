@@ -4,7 +4,7 @@ from typing import Any, Dict, List, Optional
 from datetime import datetime
 from enum import Enum
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, computed_field, field_validator
 
 
 # ============================================================
@@ -76,6 +76,20 @@ class ChatSessionOut(ChatSessionBase):
     # Optional: Include participants or owner if needed later
 
 
+class InboxSessionOut(ChatSessionOut):
+    last_activity_at: datetime
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
+    message_count: int
+    last_read_seq: int = 0
+
+    @computed_field
+    @property
+    def unread_count(self) -> int:
+        # message_count is the session's last seq
+        return max(self.message_count - self.last_read_seq, 0)
+
+
 # ============================================================
 # Message Schemas
 # ============================================================
@@ -102,13 +116,46 @@ class MessageCreate(BaseModel):
     tool_calls: Optional[List[ToolCall]] = None
     tool_metadata: Optional[Dict[str, Any]] = None  # renamed
 
+    @field_validator("tool_metadata")
+    @classmethod
+    def no_payload_ref(cls, value):
+        # "$ref" marks a stored payload reference (app/crud/payloads.py)
+        if value is not None and "$ref" in value:
+            raise ValueError('"$ref" is a reserved key')
+        return value
+
 class MessageOut(ORMBase):
     id: uuid.UUID
+    seq: int
     role: MessageRole
     content: str
     tool_calls: Optional[List[Dict[str, Any]]] = None
     tool_metadata: Optional[Dict[str, Any]] = None  # renamed
     created_at: datetime
+
+
+class MessageToolsOut(BaseModel):
+    id: uuid.UUID
+    tool_calls: List[Dict[str, Any]]
+    tool_metadata: Dict[str, Any]
+
+
+class BulkIngestOut(BaseModel):
+    session_id: uuid.UUID
+    count: int
+    first_seq: int
+    last_seq: int
+
+
+class MessageSearchResult(ORMBase):
+    id: uuid.UUID
+    session_id: uuid.UUID
+    session_title: str
+    seq: int
+    role: MessageRole
+    created_at: datetime
+    rank: float
+    snippet: str  # matched terms wrapped in <mark>...</mark>
     
     
 # ============================================================
@@ -120,6 +167,16 @@ class SessionParticipantOut(ORMBase):
     user_id: uuid.UUID
     role: str
     joined_at: datetime    
+    last_read_seq: int = 0
+
+class ReadCursorUpdate(BaseModel):
+    seq: int = Field(ge=0)
+
+
+class ReadStateOut(BaseModel):
+    last_read_seq: int
+    last_seq: int
+    unread_count: int
 
 class SessionParticipantCreate(BaseModel):
     session_id: uuid.UUID
@@ -0,0 +1,168 @@
+# app/ws/connection.py
+from __future__ import annotations
+import asyncio
+import logging
+import uuid
+from collections import deque
+from enum import Enum
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+logger = logging.getLogger(__name__)
+
+
+class SlowConsumerPolicy(str, Enum):
+    """What to do when a client's outbound queue is full."""
+    drop_oldest = "drop_oldest"  # discard the oldest queued frame
+    coalesce = "coalesce"        # replace a queued frame with the same key, else drop oldest
+    disconnect = "disconnect"    # close the socket with the configured close code
+
+
+class ClientConnection:
+    """
+    A WebSocket with its own bounded outbound queue and writer task.
+
+    Broadcasting only enqueues frames, so a slow client never stalls
+    delivery to the rest of the session or the sender's receive loop.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        on_closed: Callable[["ClientConnection"], Awaitable[None]],
+        stats: Dict[str, int],
+        max_queue: int,
+        policy: SlowConsumerPolicy,
+        close_code: int,
+        user_id: Optional[uuid.UUID] = None,
+    ) -> None:
+        self.websocket = websocket
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.policy = policy
+        self.close_code = close_code
+        self.closed = False
+        self.held = False
+        self.dropped = 0
+        self._on_closed = on_closed
+        self._stats = stats
+        # (coalesce key, encoded text frame, message seq)
+        self._queue: Deque[Tuple[Optional[str], str, Optional[int]]] = deque()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> None:
+        """Start the writer task draining this connection's queue."""
+        self._task = asyncio.create_task(self._writer())
+
+    def enqueue(self, frame: str, key: Optional[str] = None, seq: Optional[int] = None) -> bool:
+        """
+        Queue a frame for sending, applying the slow-consumer policy when
+        the queue is full. Returns False if the frame was not queued.
+        """
+        if self.closed:
+            return False
+
+        if key is not None and self.policy == SlowConsumerPolicy.coalesce:
+            for i, (queued_key, _, _) in enumerate(self._queue):
+                if queued_key == key:
+                    self._queue[i] = (key, frame, seq)
+                    self._stats["coalesced"] += 1
+                    return True
+
+        if len(self._queue) >= self.max_queue:
+            if self.policy == SlowConsumerPolicy.disconnect:
+                self._count_dropped(1 + len(self._queue))
+                self._queue.clear()
+                self.closed = True
+                self._stats["slow_disconnects"] += 1
+                asyncio.create_task(self._evict())
+                return False
+            self._queue.popleft()
+            self._count_dropped(1)
+
+        self._queue.append((key, frame, seq))
+        self._stats["queued"] += 1
+        self._ready.set()
+        return True
+
+    def hold(self) -> None:
+        """Keep queueing frames but stop sending them until release()."""
+        self.held = True
+
+    def release(self, replay: List[Tuple[Optional[int], str]] = (), after: Optional[int] = None) -> None:
+        """
+        Resume sending. Message frames from `replay` ((seq, frame) pairs)
+        and those that arrived live while held are merged into one run,
+        one frame per seq, in seq order, dropping seq <= `after`. Queued
+        frames without a seq (presence, events) go first; replay frames
+        without a seq (the "replay" marker) go last.
+        """
+        others, messages = [], {}
+        for key, frame, seq in self._queue:
+            if seq is None:
+                others.append((key, frame, seq))
+            else:
+                messages.setdefault(seq, (key, frame, seq))
+        markers, added = [], 0
+        for seq, frame in replay:
+            if seq is None:
+                markers.append((None, frame, None))
+            elif seq not in messages:
+                messages[seq] = (None, frame, seq)
+                added += 1
+        ordered = [messages[seq] for seq in sorted(messages) if after is None or seq > after]
+        self._queue = deque(others + ordered + markers)
+        self._stats["queued"] += added + len(markers)
+        self.held = False
+        self._ready.set()
+
+    async def close(self) -> None:
+        """Stop the writer task and discard anything still queued."""
+        self.closed = True
+        self._queue.clear()
+        self._ready.set()
+        task = self._task
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    def _count_dropped(self, n: int) -> None:
+        self.dropped += n
+        self._stats["dropped"] += n
+
+    async def _writer(self) -> None:
+        try:
+            while not self.closed:
+                if not self._queue or self.held:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                _, frame, _ = self._queue.popleft()
+                await self.websocket.send_text(frame)
+                self._stats["sent"] += 1
+        except asyncio.CancelledError:
+            return
+        except Exception:
+            logger.debug("WebSocket send failed, dropping connection", exc_info=True)
+            self.closed = True
+            await self._on_closed(self)
+
+    async def _evict(self) -> None:
+        """Disconnect a client that could not keep up."""
+        if self._task is not None:
+            self._task.cancel()
+        try:
+            if self.websocket.client_state != WebSocketState.DISCONNECTED:
+                await asyncio.wait_for(self.websocket.close(code=self.close_code), timeout=5)
+        except Exception:
+            pass
+        await self._on_closed(self)
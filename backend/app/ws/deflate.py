@@ -0,0 +1,94 @@
+# app/ws/deflate.py
+"""
+permessage-deflate policy for /ws/sessions/... . uvicorn negotiates the
+extension with fixed settings and compresses every message; run it with
+
+    uvicorn app.main:app --ws app.ws.deflate:WebSocketProtocol
+
+to apply the WS_COMPRESSION_* settings instead: window bits, level and
+memLevel, and a minimum size under which messages (acks, typing and
+presence events) go out uncompressed, which RFC 7692 allows per message.
+"""
+from __future__ import annotations
+import time
+from typing import Any, Optional
+
+from uvicorn.protocols.websockets.websockets_sansio_impl import WebSocketsSansIOProtocol
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from websockets.frames import CONT, CTRL_OPCODES, Frame
+
+from .. import metrics
+from ..compression import record
+from ..config import (
+    WS_COMPRESSION,
+    WS_COMPRESSION_LEVEL,
+    WS_COMPRESSION_MEM_LEVEL,
+    WS_COMPRESSION_MIN_BYTES,
+    WS_COMPRESSION_NO_CONTEXT_TAKEOVER,
+    WS_COMPRESSION_WINDOW_BITS,
+)
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """PerMessageDeflate that sends single-frame messages under `min_size` as is."""
+
+    def __init__(self, *args: Any, min_size: int = 0, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+
+    def encode(self, frame: Frame) -> Frame:
+        if frame.opcode in CTRL_OPCODES:
+            return frame
+        if frame.opcode is not CONT and frame.fin and len(frame.data) < self.min_size:
+            # RSV1 unset: an uncompressed message; the shared context is untouched
+            metrics.COMPRESSION_SKIPPED.inc("ws", "small")
+            return frame
+        started = time.thread_time()
+        encoded = super().encode(frame)
+        record("ws", "deflate", len(frame.data), len(encoded.data), time.thread_time() - started)
+        return encoded
+
+
+class ThresholdDeflateFactory(ServerPerMessageDeflateFactory):
+    """Negotiates permessage-deflate like websockets does, with ThresholdPerMessageDeflate."""
+
+    def __init__(self, *args: Any, min_size: int = 0, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+
+    def process_request_params(self, params, accepted_extensions):
+        response, ext = super().process_request_params(params, accepted_extensions)
+        return response, ThresholdPerMessageDeflate(
+            ext.remote_no_context_takeover,
+            ext.local_no_context_takeover,
+            ext.remote_max_window_bits,
+            ext.local_max_window_bits,
+            ext.compress_settings,
+            min_size=self.min_size,
+        )
+
+
+def deflate_factory() -> Optional[ThresholdDeflateFactory]:
+    """The configured extension factory, or None when WS_COMPRESSION is off."""
+    if not WS_COMPRESSION:
+        return None
+    return ThresholdDeflateFactory(
+        server_no_context_takeover=WS_COMPRESSION_NO_CONTEXT_TAKEOVER,
+        server_max_window_bits=WS_COMPRESSION_WINDOW_BITS,
+        client_max_window_bits=WS_COMPRESSION_WINDOW_BITS,
+        compress_settings={"level": WS_COMPRESSION_LEVEL, "memLevel": WS_COMPRESSION_MEM_LEVEL},
+        min_size=WS_COMPRESSION_MIN_BYTES,
+    )
+
+
+class WebSocketProtocol(WebSocketsSansIOProtocol):
+    """uvicorn's websockets (sans-I/O) protocol with the deflate policy above."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        factory = deflate_factory()
+        # --ws-per-message-deflate=false still turns compression off entirely
+        if self.config.ws_per_message_deflate and factory is not None:
+            self.conn.available_extensions = [factory]
+        else:
+            self.conn.available_extensions = []
@@ -0,0 +1,104 @@
+# app/ws/events.py
+from __future__ import annotations
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (session_id, user_id, event name)
+EventKey = Tuple[uuid.UUID, uuid.UUID, str]
+Publish = Callable[[uuid.UUID, dict, Optional[str]], Awaitable[None]]
+
+# Send times older than this many intervals are forgotten (they no longer
+# delay anything), so keys of users with no socket here do not pile up
+_EXPIRE_INTERVALS = 4
+
+
+def event_frame(user_id: uuid.UUID, event: str, data: Any) -> dict:
+    """Outbound frame for an ephemeral event."""
+    return {
+        "type": "event",
+        "event": event,
+        "user_id": str(user_id),
+        "data": data,
+        "at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class EventCoalescer:
+    """
+    Rate-shapes ephemeral events (typing, cursor hints, ...) before they are
+    broadcast: per user, per session and per event name, at most one frame
+    goes out per `interval`. Events arriving in between replace each other
+    and the latest is sent when the interval ends, so the final state is
+    never lost. Nothing here touches the database.
+    """
+
+    def __init__(self, interval: float, publish: Publish) -> None:
+        self.interval = interval
+        self._publish = publish
+        self._last_sent: Dict[EventKey, float] = {}
+        self._pending: Dict[EventKey, Any] = {}
+        self._timers: Dict[EventKey, asyncio.TimerHandle] = {}
+        self._swept_at = time.monotonic()
+        self.stats = {"published": 0, "coalesced": 0}
+
+    def submit(self, session_id: uuid.UUID, user_id: uuid.UUID, event: str, data: Any) -> None:
+        key = (session_id, user_id, event)
+        now = time.monotonic()
+        last = self._last_sent.get(key)
+        if last is None or now - last >= self.interval:
+            self._send(key, data, now)
+            return
+
+        if key in self._pending:
+            self.stats["coalesced"] += 1
+        self._pending[key] = data
+        if key not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[key] = loop.call_later(self.interval - (now - last), self._flush, key)
+
+    def discard_user(self, session_id: uuid.UUID, user_id: uuid.UUID) -> None:
+        """Drop pending events and state of a user who left the session."""
+        for key in [k for k in self._last_sent if k[0] == session_id and k[1] == user_id]:
+            self._last_sent.pop(key, None)
+            self._pending.pop(key, None)
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    def _flush(self, key: EventKey) -> None:
+        self._timers.pop(key, None)
+        if key in self._pending:
+            self._send(key, self._pending.pop(key), time.monotonic())
+
+    def _send(self, key: EventKey, data: Any, now: float) -> None:
+        session_id, user_id, event = key
+        self._last_sent[key] = now
+        self.stats["published"] += 1
+        frame = event_frame(user_id, event, data)
+        task = asyncio.get_running_loop().create_task(
+            self._publish(session_id, frame, f"event:{event}:{user_id}")
+        )
+        task.add_done_callback(_log_failure)
+        if now - self._swept_at >= _EXPIRE_INTERVALS * self.interval:
+            self._expire(now)
+
+    def _expire(self, now: float) -> None:
+        self._swept_at = now
+        horizon = _EXPIRE_INTERVALS * self.interval
+        for key in [k for k, sent in self._last_sent.items() if now - sent >= horizon and k not in self._timers]:
+            del self._last_sent[key]
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Failed to publish ephemeral event", exc_info=task.exception())
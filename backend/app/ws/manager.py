@@ -1,102 +1,585 @@
 # app/ws/manager.py
 from __future__ import annotations
+import asyncio
+import logging
 import uuid
-from typing import Dict, Set
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
 from fastapi import WebSocket
-from starlette.websockets import WebSocketState
-from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from ..db import SessionLocal
-from .. import models
+from starlette.websockets import WebSocketState
 from ..crud import messages as crud_messages
-from ..models import Message, MessageRole
+from ..db import run_in_session
+from ..models import MessageRole
+from .. import encoding
+from ..metrics import WS_BROADCAST_RECIPIENTS, WS_FANOUT_SECONDS, WS_PUBLISH_SECONDS
+from ..config import (
+    WS_BROKER, WS_SEND_QUEUE_SIZE, WS_SLOW_CONSUMER_POLICY, WS_SLOW_CONSUMER_CLOSE_CODE,
+    WS_WRITE_BATCH_SIZE, WS_WRITE_FLUSH_MS, WS_WRITE_DURABILITY, WS_WRITE_MAX_PENDING,
+    WS_RATE_CONNECTION, WS_BURST_CONNECTION, WS_RATE_USER, WS_BURST_USER,
+    WS_RATE_SESSION, WS_BURST_SESSION, WS_RATE_STREAM_DELTA, WS_BURST_STREAM_DELTA, WS_EVENT_INTERVAL_MS,
+    WS_REPLAY_BUFFER, WS_REPLAY_MAX_MESSAGES,
+    MESSAGE_CACHE_PER_SESSION, MESSAGE_CACHE_MAX_BYTES, READ_CURSOR_FLUSH_MS,
+    WS_STREAM_FLUSH_MS, WS_STREAM_MAX_CHARS, WS_STREAM_IDLE_SECONDS, WS_STREAM_MAX_PER_CONNECTION,
+)
+from .connection import ClientConnection, SlowConsumerPolicy
+from .events import EventCoalescer
+from .pubsub import Broker, create_broker
+from .ratelimit import RateLimiter
+from .reads import ReadCursorBuffer
+from .streams import Stream, StreamBuffer, StreamError
+from .tailcache import TailCache
+from .writer import FLUSH, MessageWriter
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "chat_"
+
+
+def channel_for(session_id: uuid.UUID) -> str:
+    """Broker channel name for a chat session."""
+    return f"{CHANNEL_PREFIX}{session_id.hex}"
+
+
+def message_frame(row: dict, username: Optional[str]) -> dict:
+    """Outbound frame for a persisted chat message."""
+    user_id = row["user_id"]
+    return {
+        "type": "message",
+        "id": str(row["id"]),
+        "seq": row["seq"],
+        "role": MessageRole(row["role"]).value,
+        "content": row["content"],
+        "user_id": str(user_id) if user_id is not None else None,
+        "username": username if user_id is not None else None,
+        "created_at": row["created_at"].isoformat(),
+        "tool_calls": row.get("tool_calls") or [],
+        "tool_metadata": row.get("tool_metadata") or {},
+    }
 
 
 class ConnectionManager:
     """
     Manages active WebSocket connections for chat sessions.
     Handles joining, leaving, broadcasting, and saving messages to DB.
+
+    Broadcasts go through a Broker so that every worker process delivers
+    them to its own local sockets; `active` only tracks this process.
+    Each socket is written by its own ClientConnection queue and task.
+
+    Message frames carry the row id and per-session `seq`; the latest are
+    kept per subscribed session so reconnecting clients can resume from the
+    last seq they saw.
     """
 
-    def __init__(self) -> None:
-        # session_id -> set(websockets)
-        self.active: Dict[uuid.UUID, Set[WebSocket]] = {}
+    def __init__(self, broker: Broker | None = None) -> None:
+        # session_id -> {websocket: connection}
+        self.active: Dict[uuid.UUID, Dict[WebSocket, ClientConnection]] = {}
+        # session_id -> recent (seq, encoded frame), in arrival order
+        self.recent: Dict[uuid.UUID, Deque[Tuple[int, str]]] = {}
+        self.replay_size = WS_REPLAY_BUFFER
+        self.replay_max = WS_REPLAY_MAX_MESSAGES
+        self.tail = TailCache(MESSAGE_CACHE_PER_SESSION, MESSAGE_CACHE_MAX_BYTES)
+        self.broker: Broker = broker or create_broker(WS_BROKER)
+        self.writer = MessageWriter(
+            batch_size=WS_WRITE_BATCH_SIZE,
+            flush_interval=WS_WRITE_FLUSH_MS / 1000,
+            durability=WS_WRITE_DURABILITY,
+            max_pending=WS_WRITE_MAX_PENDING,
+            # frames go out from the insert's transaction, hence in seq order on every worker
+            before_commit=self._publish_batch_in if self.broker.transactional else None,
+        )
+        self.rate_limiter = RateLimiter(
+            connection=(WS_RATE_CONNECTION, WS_BURST_CONNECTION),
+            user=(WS_RATE_USER, WS_BURST_USER),
+            session=(WS_RATE_SESSION, WS_BURST_SESSION),
+            stream=(WS_RATE_STREAM_DELTA, WS_BURST_STREAM_DELTA),
+        )
+        self.events = EventCoalescer(WS_EVENT_INTERVAL_MS / 1000, self.broadcast)
+        self.reads = ReadCursorBuffer(READ_CURSOR_FLUSH_MS / 1000)
+        self.streams = StreamBuffer(
+            interval=WS_STREAM_FLUSH_MS / 1000,
+            max_chars=WS_STREAM_MAX_CHARS,
+            idle_timeout=WS_STREAM_IDLE_SECONDS,
+            max_per_owner=WS_STREAM_MAX_PER_CONNECTION,
+            publish=self._publish_delta,
+            finish=self._finish_stream,
+        )
+        self.queue_size = WS_SEND_QUEUE_SIZE
+        self.policy = SlowConsumerPolicy(WS_SLOW_CONSUMER_POLICY)
+        self.close_code = WS_SLOW_CONSUMER_CLOSE_CODE
+        # Frame counters across all connections of this worker
+        self.counters: Dict[str, int] = {
+            "queued": 0, "sent": 0, "dropped": 0, "coalesced": 0, "slow_disconnects": 0,
+        }
+        # Reconnect replays, by where the missed messages came from
+        self.replays: Dict[str, int] = {"buffer": 0, "database": 0, "truncated": 0}
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+
+    async def start(self):
+        """Start the message and read-cursor writers and receiving broadcasts from the broker."""
+        await self.writer.start()
+        await self.reads.start()
+        await self.streams.start()
+        await self.broker.start(self._on_publish)
+
+    async def stop(self):
+        """
+        Stop the broker and flush pending messages (open streams are saved
+        as aborted); local sockets are left to close on their own.
+        """
+        await self.streams.stop()
+        await self.broker.stop()
+        await self.writer.stop()
+        await self.reads.stop()
 
     # -------------------------
     # Connection Management
     # -------------------------
 
-    async def connect(self, session_id: uuid.UUID, websocket: WebSocket):
-        """Accept a new WebSocket connection and track it by session_id."""
+    async def connect(
+        self,
+        session_id: uuid.UUID,
+        websocket: WebSocket,
+        user_id: Optional[uuid.UUID] = None,
+        since: Optional[int] = None,
+    ):
+        """
+        Accept a new WebSocket connection and track it by session_id.
+        The client is sent the session's presence roster, and the others
+        are told when `user_id` comes online. Presence is per worker: the
+        roster lists users with a socket on this worker, and join / leave
+        follow this worker's sockets only (a user connected to two workers
+        gets a "leave" when either side closes). With `since`, messages with
+        a greater seq are replayed before any live ones.
+        """
         await websocket.accept()
-        self.active.setdefault(session_id, set()).add(websocket)
 
-    def _cleanup_ws(self, session_id: uuid.UUID, websocket: WebSocket):
+        async def _on_closed(conn: ClientConnection):
+            await self.disconnect(session_id, conn.websocket)
+
+        conn = ClientConnection(
+            websocket,
+            on_closed=_on_closed,
+            stats=self.counters,
+            max_queue=self.queue_size,
+            policy=self.policy,
+            close_code=self.close_code,
+            user_id=user_id,
+        )
+        if since is not None:
+            conn.hold()
+        conn.start()
+        conns = self.active.setdefault(session_id, {})
+        first_for_user = user_id is not None and user_id not in self.roster(session_id)
+        conns[websocket] = conn
+        if len(conns) == 1:
+            self.recent[session_id] = deque(maxlen=self.replay_size)
+            await self.broker.subscribe(channel_for(session_id))
+
+        self.send_personal(session_id, websocket, {
+            "type": "presence", "event": "snapshot", "users": [str(u) for u in self.roster(session_id)],
+        })
+        if since is not None:
+            await self._replay(session_id, conn, since)
+        if first_for_user:
+            await self._announce(session_id, user_id, "join")
+
+    async def _replay(self, session_id: uuid.UUID, conn: ClientConnection, since: int):
+        """
+        Send a held connection the messages after `since`, then release it.
+        Runs after subscribing, so anything committed later arrives live;
+        release() merges those with the replayed ones in seq order.
+        The local buffer is used when it holds every missed seq; otherwise
+        they are read from the database.
+        """
+        buffered = self.recent.get(session_id, ())
+        frames = sorted(f for f in buffered if f[0] > since)
+        complete = True
+        contiguous = [seq for seq, _ in frames] == list(range(since + 1, since + 1 + len(frames)))
+        if contiguous and (frames or any(seq == since for seq, _ in buffered)):
+            self.replays["buffer"] += 1
+        else:
+            try:
+                rows = await run_in_session(crud_messages.list_messages_since, session_id, since, self.replay_max)
+            except Exception:
+                logger.warning("Replay query failed for session %s", session_id, exc_info=True)
+                rows = []
+                complete = False
+            frames = [
+                (m.seq, encoding.dumps(message_frame(crud_messages.export_row(m), email)))
+                for m, email in rows
+            ]
+            complete = complete and len(frames) < self.replay_max
+            self.replays["database"] += 1
+            if not complete:
+                self.replays["truncated"] += 1
+
+        last_seq = frames[-1][0] if frames else since
+        frames.append((None, encoding.dumps({
+            "type": "replay", "since": since, "last_seq": last_seq, "count": len(frames), "complete": complete,
+        })))
+        conn.release(frames, after=since)
+
+    async def _cleanup_ws(self, session_id: uuid.UUID, websocket: WebSocket):
         """Remove a WebSocket from tracking, cleanup if session is empty."""
-        self.active.get(session_id, set()).discard(websocket)
-        if not self.active.get(session_id):
+        conns = self.active.get(session_id)
+        if conns is None:
+            return
+        conn = conns.pop(websocket, None)
+        if conn is not None:
+            await conn.close()
+        if not conns:
             self.active.pop(session_id, None)
+            # not subscribed anymore: the buffer would develop gaps
+            self.recent.pop(session_id, None)
+            self.tail.drop(session_id)
+            await self.broker.unsubscribe(channel_for(session_id))
+        if conn is not None and conn.user_id is not None and conn.user_id not in self.roster(session_id):
+            self.events.discard_user(session_id, conn.user_id)
+            await self._announce(session_id, conn.user_id, "leave")
 
     async def disconnect(self, session_id: uuid.UUID, websocket: WebSocket):
-        """Disconnect and remove a WebSocket from tracking."""
+        """Disconnect and remove a WebSocket from tracking; its open streams end as aborted."""
+        await self._cleanup_ws(session_id, websocket)
+        await self.streams.close_owner(websocket)
         if websocket.client_state != WebSocketState.DISCONNECTED:
-            await websocket.close()
-        self._cleanup_ws(session_id, websocket)
+            try:
+                await websocket.close()
+            except Exception:
+                pass
 
     # -------------------------
     # Broadcasting
     # -------------------------
 
-    async def broadcast(self, session_id: uuid.UUID, message: dict):
+    async def broadcast(
+        self,
+        session_id: uuid.UUID,
+        message: dict,
+        key: str | None = None,
+        seq: int | None = None,
+    ):
+        """
+        Publish a JSON message to all clients in the same session,
+        on every worker subscribed to it. Frames sharing a `key` may be
+        coalesced in the queue of a slow client; frames with a message
+        `seq` are kept for reconnect replay.
+
+        The message is encoded once here; the same text frame is reused
+        for every recipient on every worker.
         """
-        Send a JSON message to all clients in the same session.
-        Automatically removes disconnected sockets.
+        frame = encoding.dumps(message)
+        with WS_PUBLISH_SECONDS.time():
+            await self.broker.publish(channel_for(session_id), {"key": key, "frame": frame, "seq": seq})
+
+    async def _on_publish(self, channel: str, envelope: dict):
+        """Broker callback: deliver a published message to local sockets."""
+        if not channel.startswith(CHANNEL_PREFIX):
+            return
+        session_id = uuid.UUID(hex=channel[len(CHANNEL_PREFIX):])
+        if envelope.get("reset"):
+            # messages were added without per-message frames: the cached tail is stale
+            self.tail.drop(session_id)
+            if envelope["frame"] is None:
+                return
+        seq = envelope.get("seq")
+        if seq is not None and session_id in self.recent:
+            self.recent[session_id].append((seq, envelope["frame"]))
+            self.tail.append(session_id, seq, envelope["frame"])
+        await self._deliver(session_id, envelope["frame"], envelope.get("key"), seq)
+
+    async def _deliver(self, session_id: uuid.UUID, frame: str, key: str | None = None, seq: int | None = None):
         """
-        dead = []
-        for ws in list(self.active.get(session_id, [])):
-            try:
-                await ws.send_json(message)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            await self.disconnect(session_id, ws)
+        Queue an encoded text frame for this worker's clients in the session.
+        Each connection's writer task sends it; dead sockets remove themselves.
+        """
+        conns = list(self.active.get(session_id, {}).values())
+        with WS_FANOUT_SECONDS.time():
+            for conn in conns:
+                conn.enqueue(frame, key, seq)
+        WS_BROADCAST_RECIPIENTS.observe(len(conns))
+
+    def publish_event(self, session_id: uuid.UUID, user_id: uuid.UUID, event: str, data: Any):
+        """Broadcast an ephemeral event (never persisted), coalesced per user and event."""
+        self.events.submit(session_id, user_id, event, data)
+
+    def mark_read(self, session_id: uuid.UUID, user_id: uuid.UUID, seq: int):
+        """
+        Advance a participant's read cursor (written in batches by
+        ReadCursorBuffer) and tell the session, as a coalesced "read" event.
+        """
+        self.reads.mark(session_id, user_id, seq)
+        self.events.submit(session_id, user_id, "read", {"seq": seq})
+
+    async def _announce(self, session_id: uuid.UUID, user_id: uuid.UUID, event: str):
+        """Tell the session a user came online ("join") or went offline ("leave")."""
+        try:
+            await self.broadcast(
+                session_id,
+                {"type": "presence", "event": event, "user_id": str(user_id)},
+            )
+        except Exception:
+            logger.warning("Failed to broadcast presence %s for session %s", event, session_id, exc_info=True)
+
+    def roster(self, session_id: uuid.UUID) -> List[uuid.UUID]:
+        """
+        Users with a live socket for the session on this worker. Other
+        workers' sockets are not included: with several workers the
+        roster and join / leave events are a per-worker view.
+        """
+        users = {c.user_id for c in self.active.get(session_id, {}).values()}
+        users.discard(None)
+        return sorted(users, key=str)
+
+    def send_personal(self, session_id: uuid.UUID, websocket: WebSocket, message: dict) -> bool:
+        """Queue a JSON message for a single local client, in order with broadcasts."""
+        conn = self.active.get(session_id, {}).get(websocket)
+        if conn is None:
+            return False
+        return conn.enqueue(encoding.dumps(message))
+
+    def stats(self) -> dict:
+        """Frame counters and current queue depth for this worker."""
+        conns = [c for session in self.active.values() for c in session.values()]
+        return {
+            **self.counters,
+            "connections": len(conns),
+            "queue_depth": sum(c.queue_depth for c in conns),
+            "throttled": dict(self.rate_limiter.throttled),
+            "events": dict(self.events.stats),
+            "replays": dict(self.replays),
+            "tail_cache": self.tail.info(),
+            "read_cursors": dict(self.reads.stats),
+            "streams": {**self.streams.stats, "open": self.streams.open_count()},
+        }
 
     # -------------------------
     # Database Interaction
     # -------------------------
 
-    async def save_message(
+    async def post_message(
         self,
         session_id: uuid.UUID,
         user_id: uuid.UUID | None,
         role: MessageRole,
-        content: str
+        content: str,
+        username: str | None = None,
+        message_id: uuid.UUID | None = None,
+        stream: str | None = None,
+    ) -> dict:
+        """
+        Save a chat message and broadcast it once committed, since the
+        frame carries its seq. With "flush" durability this returns after
+        the broadcast; with "immediate" it returns once the row is queued
+        and the broadcast follows the commit in the background.
+        `message_id` and `stream` are set for the result of a stream.
+        """
+        row = _new_row(session_id, user_id, role, content)
+        if message_id is not None:
+            row["id"] = message_id
+        published = self.broker.transactional
+        committed = await self.writer.enqueue(row, (username, stream) if published else None)
+        if self.writer.durability == FLUSH:
+            await committed
+            await self.publish_saved(row, username, stream, published)
+        else:
+            task = asyncio.create_task(self._broadcast_committed(committed, row, username, stream, published))
+            task.add_done_callback(_log_failure)
+        return row
+
+    async def _broadcast_committed(
+        self,
+        committed: asyncio.Future,
+        row: dict,
+        username: str | None,
+        stream: str | None = None,
+        published: bool = False,
+    ):
+        try:
+            await committed
+        except Exception:
+            return  # already logged by the writer; nothing was saved
+        await self.publish_saved(row, username, stream, published)
+
+    async def publish_saved(
+        self,
+        row: dict,
+        username: str | None = None,
+        stream: str | None = None,
+        published: bool = False,
     ):
         """
-        Save a chat message to the database.
-        Uses a threadpool to avoid blocking the event loop.
+        Broadcast a committed message row (see message_frame) with its seq.
+        Its author has read the session up to it. `stream` ("complete" or
+        "aborted") marks the message that ends a stream of the same id.
+        `published`: the frame already went out with the insert's
+        transaction (publish_saved_in), only the read cursor is left.
         """
+        if row["user_id"] is not None:
+            self.reads.mark(row["session_id"], row["user_id"], row["seq"])
+        if published:
+            return
+        envelope = _saved_envelope(row, username, stream)
+        with WS_PUBLISH_SECONDS.time():
+            await self.broker.publish(channel_for(row["session_id"]), envelope)
+
+    def publish_saved_in(self, db: Session, row: dict, username: str | None = None, stream: str | None = None):
+        """
+        Publish a message row from inside the transaction that assigned its
+        seq (transactional brokers only): workers receive frames in commit
+        order, which is seq order within a session. Runs in that
+        transaction's thread; call publish_saved(published=True) after commit.
+        """
+        self.broker.publish_in(db, channel_for(row["session_id"]), _saved_envelope(row, username, stream))
+
+    def _publish_batch_in(self, db: Session, items: List[Tuple[dict, Any]]):
+        """MessageWriter before_commit hook: rows tagged (username, stream) are published."""
+        for row, tag in items:
+            if tag is not None:
+                self.publish_saved_in(db, row, *tag)
+
+    # -------------------------
+    # Streamed messages
+    # -------------------------
+
+    async def stream_start(
+        self,
+        session_id: uuid.UUID,
+        websocket: WebSocket,
+        user_id: uuid.UUID | None,
+        username: str | None,
+        role: MessageRole,
+        ref: Any = None,
+    ) -> Stream:
+        """
+        Open a streamed message and announce its id; `ref` is echoed back
+        so the sender can match the id to its request. Raises StreamError.
+        """
+        stream = self.streams.open(session_id, websocket, user_id, username, role)
+        await self.broadcast(session_id, {
+            "type": "stream_start",
+            "id": str(stream.id),
+            "ref": ref,
+            "role": role.value,
+            "user_id": str(user_id) if user_id else None,
+            "username": username,
+        })
+        return stream
+
+    async def stream_delta(self, websocket: WebSocket, stream_id: Any, delta: Any):
+        """Append text to an open stream of this socket. Raises StreamError."""
+        stream = self.streams.get(websocket, stream_id)
+        if not isinstance(delta, str):
+            raise StreamError("bad_delta", "delta must be a string")
+        if not self.streams.append(stream, delta):
+            await self.streams.close(stream, aborted=True)
+            raise StreamError("stream_too_long", f"Streams are limited to {self.streams.max_chars} characters")
+
+    async def stream_end(self, websocket: WebSocket, stream_id: Any, aborted: bool = False):
+        """Finish (or abort) an open stream of this socket and save it. Raises StreamError."""
+        await self.streams.close(self.streams.get(websocket, stream_id), aborted=aborted)
+
+    async def _publish_delta(self, stream: Stream, delta: str, offset: int):
+        # `offset` is where the text starts, so clients can place deltas that arrive out of order
+        await self.broadcast(stream.session_id, {
+            "type": "stream_delta", "id": str(stream.id), "delta": delta, "offset": offset,
+        })
+
+    async def _finish_stream(self, stream: Stream, aborted: bool):
+        """
+        Persist a finished stream as one message with the stream's id. Its
+        message frame ("stream": "complete" / "aborted") replaces the
+        streamed text; an aborted stream with no text is only announced.
+        """
+        content = stream.content
+        if not content:
+            await self.broadcast(stream.session_id, {"type": "stream_end", "id": str(stream.id), "aborted": True})
+            return
+        await self.post_message(
+            stream.session_id,
+            user_id=stream.user_id,
+            role=stream.role,
+            content=content,
+            username=stream.username,
+            message_id=stream.id,
+            stream="aborted" if aborted else "complete",
+        )
+
+    async def publish_bulk(self, summary: dict, user_id: uuid.UUID | None, notify: bool = True):
+        """
+        Announce a committed bulk insert (see crud_messages.bulk_create_messages)
+        with one "bulk" frame instead of a frame per message; clients reload
+        the range. Every worker drops its cached tail of the session either way.
+        """
+        session_id = summary["session_id"]
+        if user_id is not None:
+            self.reads.mark(session_id, user_id, summary["last_seq"])
+        frame = encoding.dumps({
+            "type": "bulk",
+            "count": summary["count"],
+            "first_seq": summary["first_seq"],
+            "last_seq": summary["last_seq"],
+            "user_id": str(user_id) if user_id else None,
+        }) if notify else None
+        await self.broker.publish(channel_for(session_id), {"key": None, "frame": frame, "seq": None, "reset": True})
+
+    async def reset_tail(self, session_id: uuid.UUID):
+        """Make every worker drop its cached tail of a session (e.g. it was deleted)."""
+        await self.broker.publish(channel_for(session_id), {"key": None, "frame": None, "seq": None, "reset": True})
+
+    async def message_tail(
+        self,
+        session_id: uuid.UUID,
+        limit: int,
+        order_desc: bool = False,
+    ) -> Optional[Tuple[List[dict], Optional[str]]]:
+        """
+        The newest `limit` messages of a session as (messages, next_cursor)
+        from the hot-tail cache, loading it on a miss. Returns None when the
+        session has no live socket on this worker or `limit` is too large
+        to cache, i.e. the caller should query the database itself.
+        """
+        if session_id not in self.recent or not self.tail.enabled or limit > self.tail.per_session:
+            return None
+        page = self.tail.page(session_id, limit, order_desc)
+        if page is not None:
+            return page
+
+        messages = await run_in_session(crud_messages.list_messages_tail, session_id, self.tail.per_session)
+        if session_id in self.recent:  # still subscribed after the query
+            self.tail.fill(session_id, [
+                (m.seq, encoding.dumps(message_frame(crud_messages.export_row(m), None)))
+                for m in messages
+            ])
+        return self.tail.peek(session_id, limit, order_desc)
+
+
+def _saved_envelope(row: dict, username: str | None, stream: str | None) -> dict:
+    frame = message_frame(row, username)
+    if stream is not None:
+        frame["stream"] = stream
+    return {"key": None, "frame": encoding.dumps(frame), "seq": row["seq"]}
+
+
+def _new_row(session_id: uuid.UUID, user_id: uuid.UUID | None, role: MessageRole, content: str) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "session_id": session_id,
+        "user_id": user_id,
+        "role": role,
+        "content": content,
+        "created_at": datetime.now(timezone.utc),
+    }
 
-        def _save():
-            db: Session = SessionLocal()
-            try:
-                message = Message(
-                    session_id=session_id,
-                    user_id=user_id,
-                    role=role,
-                    content=content
-                )
-                db.add(message)
-                db.commit()
-                db.refresh(message)
-                return message
-            except Exception:
-                db.rollback()
-                raise
-            finally:
-                db.close()
 
-        return await run_in_threadpool(_save)
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Failed to broadcast chat message", exc_info=task.exception())
 
 
 # Global instance for use across app
@@ -0,0 +1,278 @@
+# app/ws/pubsub.py
+from __future__ import annotations
+import asyncio
+import importlib
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import psycopg2
+import psycopg2.extensions
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .. import encoding
+from ..config import DATABASE_URL
+from ..db import run_in_session
+
+logger = logging.getLogger(__name__)
+
+# Called by a broker for every message published on a subscribed channel
+Handler = Callable[[str, Any], Awaitable[None]]
+
+
+class Broker:
+    """
+    Interface for cross-worker fan-out backends.
+
+    A broker delivers every message published on a channel to the handler of
+    each worker that subscribed to that channel (including the publisher).
+    Transactional brokers can also publish as part of a database transaction
+    (publish_in), delivering in commit order.
+    """
+
+    transactional = False
+
+    async def start(self, handler: Handler) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str) -> None:
+        raise NotImplementedError
+
+    async def unsubscribe(self, channel: str) -> None:
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: Any) -> None:
+        raise NotImplementedError
+
+    def publish_in(self, db: Session, channel: str, message: Any) -> None:
+        """Publish when `db`'s transaction commits (nothing if it rolls back)."""
+        raise NotImplementedError
+
+
+# -------------------------
+# In-memory (single process)
+# -------------------------
+
+class InMemoryBroker(Broker):
+    """Delivers messages within the current process only."""
+
+    def __init__(self) -> None:
+        self._handler: Optional[Handler] = None
+        self._channels: Set[str] = set()
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+
+    async def stop(self) -> None:
+        self._channels.clear()
+        self._handler = None
+
+    async def subscribe(self, channel: str) -> None:
+        self._channels.add(channel)
+
+    async def unsubscribe(self, channel: str) -> None:
+        self._channels.discard(channel)
+
+    async def publish(self, channel: str, message: Any) -> None:
+        if self._handler and channel in self._channels:
+            await self._handler(channel, message)
+
+
+# -------------------------
+# Postgres LISTEN/NOTIFY
+# -------------------------
+
+class PostgresBroker(Broker):
+    """
+    Fans messages out across workers with Postgres LISTEN/NOTIFY.
+
+    Each worker holds one dedicated listening connection, watched by the
+    event loop, and LISTENs only on channels it has local sockets for.
+    Publishing goes through the regular (sync or async) connection pool. Payloads larger
+    than the NOTIFY limit (8000 bytes) are split into parts sent in one
+    transaction, which Postgres delivers contiguously and in order.
+
+    Notifications are delivered in commit order, so messages published with
+    publish_in from the transaction that assigned their seq arrive on every
+    worker in seq order.
+    """
+
+    transactional = True
+
+    # Stay safely below the 8000 byte NOTIFY payload limit (header included)
+    MAX_CHUNK_BYTES = 7000
+
+    def __init__(self, database_url: str) -> None:
+        url = make_url(database_url).set(drivername="postgresql")
+        self._dsn = url.render_as_string(hide_password=False)
+        self._handler: Optional[Handler] = None
+        self._conn = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._channels: Set[str] = set()
+        self._lock = asyncio.Lock()
+        self._partial: Dict[str, List[Optional[str]]] = {}
+        self._reconnecting: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+        self._loop = asyncio.get_running_loop()
+        await self._open()
+
+    async def stop(self) -> None:
+        if self._reconnecting:
+            self._reconnecting.cancel()
+            self._reconnecting = None
+        self._close()
+        self._channels.clear()
+        self._partial.clear()
+
+    async def subscribe(self, channel: str) -> None:
+        async with self._lock:
+            if channel in self._channels:
+                return
+            self._channels.add(channel)
+            if self._conn is not None:
+                await run_in_threadpool(self._execute, f'LISTEN "{channel}"')
+
+    async def unsubscribe(self, channel: str) -> None:
+        async with self._lock:
+            if channel not in self._channels:
+                return
+            self._channels.discard(channel)
+            if self._conn is not None:
+                await run_in_threadpool(self._execute, f'UNLISTEN "{channel}"')
+
+    async def publish(self, channel: str, message: Any) -> None:
+        payload = encoding.dumps(message)
+        await run_in_session(self._notify, channel, self._split(payload))
+
+    def publish_in(self, db: Session, channel: str, message: Any) -> None:
+        self._send(db, channel, self._split(encoding.dumps(message)))
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    def _split(self, payload: str) -> List[str]:
+        """Frame a payload as '<id>:<index>:<total>:<chunk>' notifications."""
+        size = self.MAX_CHUNK_BYTES if payload.isascii() else self.MAX_CHUNK_BYTES // 4
+        chunks = [payload[i:i + size] for i in range(0, len(payload), size)] or [""]
+        msg_id = uuid.uuid4().hex
+        return [f"{msg_id}:{i}:{len(chunks)}:{c}" for i, c in enumerate(chunks)]
+
+    @classmethod
+    def _notify(cls, db: Session, channel: str, parts: List[str]) -> None:
+        cls._send(db, channel, parts)
+        db.commit()
+
+    @staticmethod
+    def _send(db: Session, channel: str, parts: List[str]) -> None:
+        for part in parts:
+            db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": part})
+
+    def _execute(self, sql: str) -> None:
+        with self._conn.cursor() as cur:
+            cur.execute(sql)
+
+    async def _open(self) -> None:
+        def _connect():
+            conn = psycopg2.connect(self._dsn)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                for channel in self._channels:
+                    cur.execute(f'LISTEN "{channel}"')
+            return conn
+
+        async with self._lock:
+            self._conn = await run_in_threadpool(_connect)
+            self._loop.add_reader(self._conn.fileno(), self._on_readable)
+
+    def _close(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._loop.remove_reader(self._conn.fileno())
+        except Exception:
+            pass
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def _on_readable(self) -> None:
+        try:
+            self._conn.poll()
+        except Exception:
+            logger.exception("Lost Postgres LISTEN connection, reconnecting")
+            self._close()
+            if not self._reconnecting:
+                self._reconnecting = self._loop.create_task(self._reconnect())
+            return
+
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            message = self._reassemble(notify.channel, notify.payload)
+            if message is not None:
+                self._loop.create_task(self._dispatch(notify.channel, message))
+
+    def _reassemble(self, channel: str, payload: str) -> Optional[Any]:
+        msg_id, index, total, chunk = payload.split(":", 3)
+        index, total = int(index), int(total)
+        if total == 1:
+            return encoding.loads(chunk)
+        parts = self._partial.setdefault(msg_id, [None] * total)
+        parts[index] = chunk
+        if any(p is None for p in parts):
+            return None
+        del self._partial[msg_id]
+        return encoding.loads("".join(parts))
+
+    async def _dispatch(self, channel: str, message: Any) -> None:
+        try:
+            await self._handler(channel, message)
+        except Exception:
+            logger.exception("Broker handler failed for channel %s", channel)
+
+    async def _reconnect(self) -> None:
+        delay = 0.5
+        try:
+            while self._conn is None:
+                try:
+                    await self._open()
+                except Exception:
+                    logger.warning("Postgres LISTEN reconnect failed, retrying in %.1fs", delay)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 30.0)
+            self._partial.clear()
+        finally:
+            self._reconnecting = None
+
+
+# -------------------------
+# Factory
+# -------------------------
+
+BROKERS: Dict[str, Callable[[], Broker]] = {
+    "memory": InMemoryBroker,
+    "postgres": lambda: PostgresBroker(DATABASE_URL),
+}
+
+
+def create_broker(name: str) -> Broker:
+    """
+    Build a broker by name ("memory", "postgres") or by dotted path
+    ("package.module:ClassName") to a Broker subclass.
+    """
+    if name in BROKERS:
+        return BROKERS[name]()
+    if ":" in name:
+        module_name, _, attr = name.partition(":")
+        return getattr(importlib.import_module(module_name), attr)()
+    raise ValueError(f"Unknown WebSocket broker: {name!r}")
@@ -0,0 +1,122 @@
+# app/ws/ratelimit.py
+from __future__ import annotations
+import time
+import uuid
+from typing import Dict, Optional
+
+from ..metrics import WS_THROTTLED_FRAMES
+
+# Sweep idle per-user/per-session buckets every this many checks
+_SWEEP_EVERY = 1024
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: Optional[float] = None) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def full(self) -> bool:
+        return self.tokens >= self.burst
+
+
+class RateLimiter:
+    """
+    Token-bucket limits on inbound WebSocket frames, per connection, per user
+    and per session (a rate of 0 disables that scope). A frame is admitted
+    only if every scope has a token, and then takes one from each.
+    stream_delta frames use a separate per-connection "stream" bucket.
+
+    Per-user and per-session buckets are tracked in this worker only.
+    """
+
+    SCOPES = ("connection", "user", "session", "stream")
+
+    def __init__(
+        self,
+        connection: tuple[float, float],
+        user: tuple[float, float],
+        session: tuple[float, float],
+        stream: tuple[float, float] = (0, 0),
+    ) -> None:
+        self.limits = {"connection": connection, "user": user, "session": session, "stream": stream}
+        self._users: Dict[uuid.UUID, TokenBucket] = {}
+        self._sessions: Dict[uuid.UUID, TokenBucket] = {}
+        self._checks = 0
+        # frames rejected, by the scope that ran out
+        self.throttled: Dict[str, int] = {scope: 0 for scope in self.SCOPES}
+
+    def connection_bucket(self, scope: str = "connection") -> Optional[TokenBucket]:
+        """A fresh `scope` bucket for a new connection (None when unlimited)."""
+        rate, burst = self.limits[scope]
+        return TokenBucket(rate, burst) if rate > 0 else None
+
+    def allow_stream(self, stream_bucket: Optional[TokenBucket]) -> bool:
+        """Admit one stream_delta frame against the connection's stream bucket."""
+        if stream_bucket is None:
+            return True
+        stream_bucket.refill(time.monotonic())
+        if stream_bucket.tokens < 1:
+            self._throttle("stream")
+            return False
+        stream_bucket.tokens -= 1
+        return True
+
+    def allow(self, conn_bucket: Optional[TokenBucket], user_id: uuid.UUID, session_id: uuid.UUID) -> bool:
+        """Admit one frame, or count it as throttled and return False."""
+        now = time.monotonic()
+        buckets = {
+            "connection": conn_bucket,
+            "user": self._bucket(self._users, "user", user_id, now),
+            "session": self._bucket(self._sessions, "session", session_id, now),
+        }
+        for scope, bucket in buckets.items():
+            if bucket is None:
+                continue
+            bucket.refill(now)
+            if bucket.tokens < 1:
+                self._throttle(scope)
+                return False
+        for bucket in buckets.values():
+            if bucket is not None:
+                bucket.tokens -= 1
+
+        self._checks += 1
+        if self._checks % _SWEEP_EVERY == 0:
+            self._sweep(now)
+        return True
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    def _throttle(self, scope: str) -> None:
+        self.throttled[scope] += 1
+        WS_THROTTLED_FRAMES.inc(scope)
+
+    def _bucket(self, buckets: Dict[uuid.UUID, TokenBucket], scope: str, key: uuid.UUID, now: float) -> Optional[TokenBucket]:
+        rate, burst = self.limits[scope]
+        if rate <= 0:
+            return None
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rate, burst, now)
+        return bucket
+
+    def _sweep(self, now: float) -> None:
+        """Forget buckets that have refilled completely; they are equivalent to new ones."""
+        for buckets in (self._users, self._sessions):
+            for key, bucket in list(buckets.items()):
+                bucket.refill(now)
+                if bucket.full:
+                    del buckets[key]
@@ -0,0 +1,84 @@
+# app/ws/reads.py
+from __future__ import annotations
+import asyncio
+import logging
+import uuid
+from typing import Dict, Optional, Tuple
+
+from ..crud import sessions as crud_sessions
+from ..db import run_in_session
+
+logger = logging.getLogger(__name__)
+
+# (session_id, user_id)
+ReaderKey = Tuple[uuid.UUID, uuid.UUID]
+
+
+class ReadCursorBuffer:
+    """
+    Write-behind read cursors. A client scrolling through a session marks
+    many messages read; only the highest seq per participant is kept and
+    all pending cursors are written in one batch every `flush_interval`.
+    """
+
+    def __init__(self, flush_interval: float) -> None:
+        self.flush_interval = flush_interval
+        self._pending: Dict[ReaderKey, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"marked": 0, "coalesced": 0, "written": 0, "batches": 0}
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and write whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def mark(self, session_id: uuid.UUID, user_id: uuid.UUID, seq: int) -> None:
+        """Record that the user has read the session up to `seq`."""
+        key = (session_id, user_id)
+        self.stats["marked"] += 1
+        current = self._pending.get(key)
+        if current is not None:
+            self.stats["coalesced"] += 1
+            if seq <= current:
+                return
+        self._pending[key] = seq
+
+    def pending(self, session_id: uuid.UUID, user_id: uuid.UUID) -> int:
+        """Cursor not yet written for the user, or 0."""
+        return self._pending.get((session_id, user_id), 0)
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        cursors = [(sid, uid, seq) for (sid, uid), seq in batch.items()]
+        try:
+            await run_in_session(crud_sessions.advance_read_cursors, cursors)
+        except Exception:
+            logger.warning("Failed to write %d read cursors", len(cursors), exc_info=True)
+            # keep them for the next flush unless newer ones arrived meanwhile
+            for key, seq in batch.items():
+                if self._pending.get(key, 0) < seq:
+                    self._pending[key] = seq
+            return
+        self.stats["written"] += len(cursors)
+        self.stats["batches"] += 1
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
@@ -0,0 +1,171 @@
+# app/ws/streams.py
+from __future__ import annotations
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..models import MessageRole
+
+logger = logging.getLogger(__name__)
+
+
+class StreamError(Exception):
+    """A stream frame that cannot be applied; `code` goes back to the client."""
+
+    def __init__(self, code: str, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+@dataclass
+class Stream:
+    """A message being streamed: its text so far and what is not yet broadcast."""
+    id: uuid.UUID
+    session_id: uuid.UUID
+    owner: Any  # the WebSocket that started it
+    user_id: Optional[uuid.UUID]
+    username: Optional[str]
+    role: MessageRole
+    parts: List[str] = field(default_factory=list)
+    unsent: List[str] = field(default_factory=list)  # appended since the last broadcast delta
+    length: int = 0
+    sent: int = 0  # characters already broadcast
+    last_activity: float = field(default_factory=time.monotonic)
+
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+
+
+# publish(stream, delta, offset) and finish(stream, aborted)
+PublishDelta = Callable[[Stream, str, int], Awaitable[None]]
+Finish = Callable[[Stream, bool], Awaitable[None]]
+
+
+class StreamBuffer:
+    """
+    Streamed messages (start / delta / end) in flight on this worker.
+    Deltas are only broadcast: those arriving within `interval` of each
+    other go out as one concatenated delta. Nothing is persisted until the
+    stream ends, is aborted, its socket closes or it sits idle for
+    `idle_timeout`; then `finish` writes the whole text as one message.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        max_chars: int,
+        idle_timeout: float,
+        max_per_owner: int,
+        publish: PublishDelta,
+        finish: Finish,
+    ) -> None:
+        self.interval = interval
+        self.max_chars = max_chars
+        self.idle_timeout = idle_timeout
+        self.max_per_owner = max_per_owner
+        self._publish = publish
+        self._finish = finish
+        self._streams: Dict[uuid.UUID, Stream] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"started": 0, "completed": 0, "aborted": 0, "deltas_in": 0, "deltas_out": 0}
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and persist every open stream as aborted."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for stream in list(self._streams.values()):
+            await self.close(stream, aborted=True)
+
+    def open(
+        self,
+        session_id: uuid.UUID,
+        owner: Any,
+        user_id: Optional[uuid.UUID],
+        username: Optional[str],
+        role: MessageRole,
+    ) -> Stream:
+        if sum(1 for s in self._streams.values() if s.owner is owner) >= self.max_per_owner:
+            raise StreamError("too_many_streams", f"At most {self.max_per_owner} open streams per connection")
+        stream = Stream(uuid.uuid4(), session_id, owner, user_id, username, role)
+        self._streams[stream.id] = stream
+        self.stats["started"] += 1
+        return stream
+
+    def get(self, owner: Any, stream_id: Any) -> Stream:
+        """The open stream `stream_id` started by `owner`."""
+        try:
+            stream = self._streams.get(uuid.UUID(str(stream_id)))
+        except ValueError:
+            stream = None
+        if stream is None or stream.owner is not owner:
+            raise StreamError("unknown_stream", "No such open stream on this connection")
+        return stream
+
+    def append(self, stream: Stream, delta: str) -> bool:
+        """Add text to a stream; False when it would exceed max_chars."""
+        if stream.length + len(delta) > self.max_chars:
+            return False
+        stream.parts.append(delta)
+        stream.unsent.append(delta)
+        stream.length += len(delta)
+        stream.last_activity = time.monotonic()
+        self.stats["deltas_in"] += 1
+        return True
+
+    async def close(self, stream: Stream, aborted: bool = False) -> None:
+        """Broadcast what is pending, then persist the stream (once)."""
+        if self._streams.pop(stream.id, None) is None:
+            return
+        self.stats["aborted" if aborted else "completed"] += 1
+        await self._send_pending(stream)
+        await self._finish(stream, aborted)
+
+    async def close_owner(self, owner: Any) -> None:
+        """The owner's socket closed: its open streams end as aborted."""
+        for stream in [s for s in self._streams.values() if s.owner is owner]:
+            await self.close(stream, aborted=True)
+
+    def open_count(self) -> int:
+        return len(self._streams)
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    async def _send_pending(self, stream: Stream) -> None:
+        if not stream.unsent:
+            return
+        delta = "".join(stream.unsent)
+        stream.unsent.clear()
+        offset, stream.sent = stream.sent, stream.length
+        self.stats["deltas_out"] += 1
+        try:
+            await self._publish(stream, delta, offset)
+        except Exception:
+            logger.warning("Failed to broadcast delta of stream %s", stream.id, exc_info=True)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            for stream in list(self._streams.values()):
+                try:
+                    if now - stream.last_activity > self.idle_timeout:
+                        await self.close(stream, aborted=True)
+                    else:
+                        await self._send_pending(stream)
+                except Exception:
+                    logger.warning("Stream %s flush failed", stream.id, exc_info=True)
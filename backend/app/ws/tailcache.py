@@ -0,0 +1,141 @@
+# app/ws/tailcache.py
+from __future__ import annotations
+import uuid
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .. import encoding
+from ..crud.messages import encode_seq_cursor
+
+
+class _Tail:
+    __slots__ = ("frames", "nbytes")
+
+    def __init__(self) -> None:
+        # (seq, encoded message frame), ascending and contiguous
+        self.frames: Deque[Tuple[int, str]] = deque()
+        self.nbytes = 0
+
+
+class TailCache:
+    """
+    The most recent messages of sessions with live sockets on this worker,
+    kept as encoded message frames so tail reads of the message history
+    need no query.
+
+    Entries are loaded from the database on a miss and then extended with
+    every committed message the broker delivers, so they are only kept for
+    sessions this worker is subscribed to. Sessions are evicted least
+    recently used first once `max_bytes` is exceeded.
+    """
+
+    def __init__(self, per_session: int, max_bytes: int) -> None:
+        self.per_session = per_session
+        self.max_bytes = max_bytes
+        self._tails: "OrderedDict[uuid.UUID, _Tail]" = OrderedDict()
+        # highest seq delivered per subscribed session, cached or not
+        self._seen: Dict[uuid.UUID, int] = {}
+        self.nbytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_session > 0 and self.max_bytes > 0
+
+    def page(self, session_id: uuid.UUID, limit: int, order_desc: bool = False) -> Optional[Tuple[List[dict], Optional[str]]]:
+        """
+        The newest `limit` messages and the cursor to older ones, shaped like
+        crud.messages.list_messages_page without a cursor; None on a miss.
+        """
+        page = self.peek(session_id, limit, order_desc)
+        if page is None:
+            self.stats["misses"] += 1
+        else:
+            self.stats["hits"] += 1
+            self._tails.move_to_end(session_id)
+        return page
+
+    def peek(self, session_id: uuid.UUID, limit: int, order_desc: bool = False) -> Optional[Tuple[List[dict], Optional[str]]]:
+        """Like page(), without counting the lookup or refreshing recency."""
+        tail = self._tails.get(session_id)
+        if tail is None:
+            return None
+        complete = not tail.frames or tail.frames[0][0] == 1  # holds the whole history
+        if len(tail.frames) < limit and not complete:
+            return None
+
+        frames = list(tail.frames)[-limit:]
+        messages = [encoding.loads(frame) for _, frame in frames]
+        next_cursor = None
+        if frames and frames[0][0] > 1:  # older messages exist
+            next_cursor = encode_seq_cursor(frames[0][0])
+        if order_desc:
+            messages.reverse()
+        return messages, next_cursor
+
+    def fill(self, session_id: uuid.UUID, frames: List[Tuple[int, str]]) -> None:
+        """
+        Install a session's tail as loaded from the database, ascending by
+        seq. Skipped when a newer message was delivered during the load.
+        """
+        if not self.enabled:
+            return
+        last = frames[-1][0] if frames else 0
+        if self._seen.get(session_id, 0) > last:
+            return
+        self.drop(session_id)
+        tail = self._tails[session_id] = _Tail()
+        for seq, frame in frames[-self.per_session:]:
+            self._push(tail, seq, frame)
+        self._seen[session_id] = last
+        self._evict()
+
+    def append(self, session_id: uuid.UUID, seq: int, frame: str) -> None:
+        """Add a committed message delivered for a subscribed session."""
+        self._seen[session_id] = max(seq, self._seen.get(session_id, 0))
+        tail = self._tails.get(session_id)
+        if tail is None:
+            return
+        last = tail.frames[-1][0] if tail.frames else 0
+        if seq <= last:
+            return  # already loaded from the database
+        if seq != last + 1:
+            # an earlier message has not arrived yet; reload on the next read
+            self._remove(session_id)
+            return
+        self._push(tail, seq, frame)
+        while len(tail.frames) > self.per_session:
+            self._pop(tail)
+        self._evict()
+
+    def drop(self, session_id: uuid.UUID) -> None:
+        """Forget a session, e.g. when it is deleted or no longer subscribed."""
+        self._remove(session_id)
+        self._seen.pop(session_id, None)
+
+    def info(self) -> dict:
+        return {**self.stats, "sessions": len(self._tails), "bytes": self.nbytes}
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    def _push(self, tail: _Tail, seq: int, frame: str) -> None:
+        tail.frames.append((seq, frame))
+        tail.nbytes += len(frame)
+        self.nbytes += len(frame)
+
+    def _pop(self, tail: _Tail) -> None:
+        _, frame = tail.frames.popleft()
+        tail.nbytes -= len(frame)
+        self.nbytes -= len(frame)
+
+    def _remove(self, session_id: uuid.UUID) -> None:
+        tail = self._tails.pop(session_id, None)
+        if tail is not None:
+            self.nbytes -= tail.nbytes
+
+    def _evict(self) -> None:
+        while self.nbytes > self.max_bytes and self._tails:
+            self._remove(next(iter(self._tails)))
+            self.stats["evictions"] += 1
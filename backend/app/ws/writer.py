@@ -0,0 +1,194 @@
+# app/ws/writer.py
+from __future__ import annotations
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..crud.messages import allocate_seq
+from ..db import run_in_session
+from ..metrics import MESSAGE_BATCH_ROWS, MESSAGE_SAVE_SECONDS
+from ..models import Message
+
+logger = logging.getLogger(__name__)
+
+FLUSH = "flush"          # callers wait until the row is committed
+IMMEDIATE = "immediate"  # callers return as soon as the row is queued
+
+_STOP = object()
+
+# Called with the batch's (row, tag) pairs after the rows are inserted (seq
+# set) and before the commit, in the same transaction
+BeforeCommit = Callable[[Session, List[Tuple[dict, Any]]], None]
+
+
+class MessageWriter:
+    """
+    Write-behind persistence for WebSocket chat messages.
+
+    Rows from every session are queued and written by a single background
+    task as multi-row INSERTs, flushed when `batch_size` rows are pending or
+    `flush_interval` seconds after the first pending row, whichever is first.
+    Each row gets its per-session `seq` in the same transaction, in which
+    `before_commit` (if set) can publish the rows in commit order.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        durability: str,
+        max_pending: int,
+        before_commit: Optional[BeforeCommit] = None,
+    ) -> None:
+        if durability not in (FLUSH, IMMEDIATE):
+            raise ValueError(f"Unknown write durability: {durability!r}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.before_commit = before_commit
+        self._queue: asyncio.Queue = asyncio.Queue(max_pending)
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"rows": 0, "batches": 0, "failed_rows": 0}
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush everything still queued, then stop the writer task."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def enqueue(self, row: dict, tag: Any = None) -> asyncio.Future:
+        """
+        Queue a message row and return a future resolved once it is
+        committed (with row["seq"] set), or failed with the insert error.
+        `tag` is handed to `before_commit` along with the row.
+        """
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_error)  # failures are logged by _flush
+        future.add_done_callback(_observe_save(time.perf_counter()))
+        await self._queue.put((row, future, tag))
+        return future
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = await self._queue.get()
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    remaining = deadline - time.monotonic()
+                    if len(batch) >= self.batch_size or remaining <= 0:
+                        break
+                    if not self._queue.empty():
+                        item = self._queue.get_nowait()
+                        continue
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                await self._flush(batch)
+            except Exception as exc:
+                # e.g. no session could be opened, or the per-row retry's
+                # rollback failed: fail this batch and keep writing, or
+                # the queue fills and every enqueue blocks
+                logger.exception("Chat message writer failed on a batch of %d rows", len(batch))
+                for _, future, _ in batch:
+                    if not future.done():
+                        self.stats["failed_rows"] += 1
+                        future.set_exception(exc)
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future, Any]]) -> None:
+        if not batch:
+            return
+        items = [(row, tag) for row, _, tag in batch]
+        MESSAGE_BATCH_ROWS.observe(len(items))
+        try:
+            await run_in_session(self._insert, items)
+            errors: List[Optional[Exception]] = [None] * len(items)
+            self.stats["batches"] += 1
+        except Exception:
+            # One bad row (e.g. its session was just deleted) must not
+            # lose the whole batch: retry the rows one by one.
+            logger.warning("Batch insert of %d chat messages failed, retrying per row", len(items))
+            errors = await run_in_session(self._insert_each, items)
+
+        for (row, future, _), error in zip(batch, errors):
+            if error is None:
+                self.stats["rows"] += 1
+            else:
+                self.stats["failed_rows"] += 1
+                logger.error("Failed to persist chat message %s: %s", row.get("id"), error)
+            if not future.done():
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    def _insert(self, db: Session, items: List[Tuple[dict, Any]]) -> None:
+        rows = [row for row, _ in items]
+        _assign_seqs(db, rows)
+        db.execute(insert(Message), rows)
+        if self.before_commit is not None:
+            self.before_commit(db, items)
+        db.commit()
+
+    def _insert_each(self, db: Session, items: List[Tuple[dict, Any]]) -> List[Optional[Exception]]:
+        errors: List[Optional[Exception]] = []
+        for row, tag in items:
+            try:
+                self._insert(db, [(row, tag)])
+                errors.append(None)
+            except Exception as exc:
+                db.rollback()
+                errors.append(exc)
+        return errors
+
+
+def _assign_seqs(db: Session, rows: List[dict]) -> None:
+    """
+    Number rows within their sessions, in queue order, with one UPDATE per
+    session (which also moves its inbox preview to the last row). Sessions
+    are locked in a fixed order so concurrent writers cannot deadlock.
+    """
+    by_session: Dict[uuid.UUID, List[dict]] = {}
+    for row in rows:
+        by_session.setdefault(row["session_id"], []).append(row)
+    for session_id in sorted(by_session, key=str):
+        session_rows = by_session[session_id]
+        last = session_rows[-1]
+        first = allocate_seq(
+            db, session_id, len(session_rows), last_at=last["created_at"], last_content=last["content"],
+        )
+        for offset, row in enumerate(session_rows):
+            row["seq"] = first + offset
+
+
+def _consume_error(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+def _observe_save(queued_at: float):
+    def _done(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            MESSAGE_SAVE_SECONDS.observe(time.perf_counter() - queued_at)
+    return _done
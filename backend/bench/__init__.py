@@ -0,0 +1,2 @@
+# bench/__init__.py
+"""Load generation and benchmarking; run with `python -m bench --help`."""
@@ -0,0 +1,114 @@
+# bench/__main__.py
+"""
+Load test against a running backend and its local Postgres.
+
+    python -m bench --sessions 200 --session-size 10 --rate 0.5 \\
+        --duration 60 --pid $(pgrep -d, -f "uvicorn app.main") --out report.json
+
+Seeds fresh users, sessions and participants straight into DATABASE_URL,
+connects every member over WebSocket, sends messages at --rate per sender
+and drives the REST routes alongside, then writes a JSON report: message
+throughput, broadcast latency percentiles (send to receipt by the other
+members), REST latency per route, Postgres commits per second and worker
+CPU / peak RSS. Seeded data is deleted afterwards unless --keep.
+
+The server's WS_RATE_* limits apply: keep --rate below WS_RATE_CONNECTION
+or raise the limits for the run.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+
+from .clients import Results, run_rest, run_ws
+from .report import ProcessSampler, commit_count, percentiles
+from .seed import cleanup, seed
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="python -m bench", description="WebSocket and REST load test")
+    p.add_argument("--url", default="http://localhost:8000", help="backend base URL")
+    p.add_argument("--sessions", type=int, default=100)
+    p.add_argument("--session-size", type=int, default=10, help="members (WebSocket clients) per session")
+    p.add_argument("--rate", type=float, default=0.5, help="messages per second per sending client")
+    p.add_argument("--senders", type=float, default=1.0, help="fraction of clients that send")
+    p.add_argument("--duration", type=float, default=30.0, help="seconds")
+    p.add_argument("--connect-concurrency", type=int, default=200, help="WebSocket handshakes in flight")
+    p.add_argument("--rest-concurrency", type=int, default=20, help="concurrent REST loops (0: none)")
+    p.add_argument("--login-share", type=float, default=0.05, help="share of REST calls that are logins")
+    p.add_argument("--pid", default="", help="comma-separated server worker pids to sample CPU/RSS")
+    p.add_argument("--out", help="write the JSON report here (default: stdout)")
+    p.add_argument("--keep", action="store_true", help="keep the seeded data")
+    return p.parse_args(argv)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    fixture = seed(args.sessions, args.session_size)
+    ws_url = args.url.replace("http", "ws", 1)
+    results = Results()
+    sampler = ProcessSampler([int(p) for p in args.pid.split(",") if p])
+    try:
+        commits_before = commit_count()
+        await sampler.start()
+        started = time.monotonic()
+        jobs = [run_ws(ws_url, fixture, args.rate, args.senders, args.duration, args.connect_concurrency, results)]
+        if args.rest_concurrency > 0:
+            jobs.append(run_rest(args.url, fixture, args.rest_concurrency, args.duration, args.login_share, results))
+        await asyncio.gather(*jobs)
+        elapsed = time.monotonic() - started
+        processes = await sampler.stop()
+        commits_after = commit_count()
+    finally:
+        if not args.keep:
+            cleanup(fixture)
+
+    rest_calls = sum(len(v) for v in results.rest_latency.values())
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "pid")},
+        "host": {"python": platform.python_version(), "machine": platform.machine()},
+        "elapsed_s": round(elapsed, 2),
+        "ws": {
+            "clients": sum(len(m) for m in fixture.members.values()),
+            "connected": results.connected,
+            "connect_errors": results.connect_errors,
+            "closed_early": results.closed_early,
+            "sent": results.sent,
+            "received": results.received,
+            "send_errors": results.send_errors,
+            "server_errors": results.server_errors,
+            "sent_per_s": round(results.sent / elapsed, 1),
+            "delivered_per_s": round(results.received / elapsed, 1),
+            "broadcast_latency_ms": percentiles(results.broadcast_latency),
+        },
+        "rest": {
+            "requests_per_s": round(rest_calls / elapsed, 1),
+            "routes": {
+                name: {**percentiles(values), "errors": results.rest_errors.get(name, 0)}
+                for name, values in sorted(results.rest_latency.items())
+            },
+        },
+        "db": {
+            "commits": None if commits_before is None else commits_after - commits_before,
+            "commits_per_s": None if commits_before is None else round((commits_after - commits_before) / elapsed, 1),
+        },
+        "processes": processes,
+    }
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# bench/clients.py
+from __future__ import annotations
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+from .seed import BENCH_PASSWORD, Fixture
+
+MARK = "bench:"
+
+
+@dataclass
+class Results:
+    sent: int = 0
+    received: int = 0
+    connected: int = 0
+    connect_errors: int = 0
+    send_errors: int = 0
+    server_errors: int = 0  # {"type": "error"} frames, e.g. rate limited
+    closed_early: int = 0
+    broadcast_latency: List[float] = field(default_factory=list)     # seconds
+    rest_latency: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    rest_errors: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+
+# -------------------------
+# WebSocket clients
+# -------------------------
+
+async def ws_client(
+    ws_url: str,
+    session_id: uuid.UUID,
+    token: str,
+    index: int,
+    rate: float,
+    stop_at: float,
+    connect_slots: asyncio.Semaphore,
+    results: Results,
+) -> None:
+    """
+    One member of a session: sends a message every ~1/rate seconds (rate 0
+    only listens) and measures, for every message from another client, the
+    time from send to receipt. All clients share this process's clock.
+    """
+    url = f"{ws_url}/ws/sessions/{session_id}?token={token}"
+    try:
+        async with connect_slots:
+            ws = await websockets.connect(url, max_queue=None, open_timeout=30)
+    except Exception:
+        results.connect_errors += 1
+        return
+    results.connected += 1
+
+    async def _send():
+        while True:
+            await asyncio.sleep(random.expovariate(rate))
+            if time.time() >= stop_at:
+                return
+            content = f"{MARK}{index}:{time.time():.6f}"
+            try:
+                await ws.send(json.dumps({"content": content}))
+                results.sent += 1
+            except Exception:
+                results.send_errors += 1
+                return
+
+    async def _receive():
+        async for raw in ws:
+            frame = json.loads(raw)
+            if frame.get("type") == "error":
+                results.server_errors += 1
+                continue
+            content = frame.get("content")
+            if not isinstance(content, str) or not content.startswith(MARK):
+                continue
+            sender, sent_at = content[len(MARK):].split(":", 1)
+            if int(sender) != index:
+                results.received += 1
+                results.broadcast_latency.append(time.time() - float(sent_at))
+
+    sender = asyncio.create_task(_send()) if rate > 0 else None
+    receiver = asyncio.create_task(_receive())
+    try:
+        # listen a little past the end so in-flight broadcasts are counted
+        await asyncio.wait_for(asyncio.shield(receiver), max(stop_at - time.time(), 0) + 2)
+        results.closed_early += 1
+    except asyncio.TimeoutError:
+        pass
+    except Exception:
+        results.closed_early += 1
+    finally:
+        for task in (sender, receiver):
+            if task is not None:
+                task.cancel()
+        await ws.close()
+
+
+async def run_ws(
+    ws_url: str,
+    fixture: Fixture,
+    rate: float,
+    senders: float,
+    duration: float,
+    connect_concurrency: int,
+    results: Results,
+) -> None:
+    """Connect every seeded member; a `senders` fraction of them also send."""
+    slots = asyncio.Semaphore(connect_concurrency)
+    stop_at = time.time() + duration
+    tasks = []
+    index = 0
+    for session_id, members in fixture.members.items():
+        for user_id in members:
+            client_rate = rate if random.random() < senders else 0.0
+            tasks.append(ws_client(
+                ws_url, session_id, fixture.tokens[user_id], index, client_rate, stop_at, slots, results,
+            ))
+            index += 1
+    await asyncio.gather(*tasks)
+
+
+# -------------------------
+# REST driver
+# -------------------------
+
+async def _timed(client: httpx.AsyncClient, name: str, results: Results, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except httpx.HTTPError:
+        results.rest_errors[name] += 1
+        return None
+    results.rest_latency[name].append(time.perf_counter() - start)
+    if response.status_code >= 400:
+        results.rest_errors[name] += 1
+    return response
+
+
+async def run_rest(
+    base_url: str,
+    fixture: Fixture,
+    concurrency: int,
+    duration: float,
+    login_share: float,
+    results: Results,
+) -> None:
+    """
+    `concurrency` loops, each repeatedly picking a random member and calling
+    the inbox, a page of message history, or (with probability
+    `login_share`) /auth/login.
+    """
+    pairs = [(sid, uid) for sid, members in fixture.members.items() for uid in members]
+    stop_at = time.time() + duration
+
+    async def _loop(client: httpx.AsyncClient):
+        while time.time() < stop_at:
+            session_id, user_id = random.choice(pairs)
+            headers = {"Authorization": f"Bearer {fixture.tokens[user_id]}"}
+            roll = random.random()
+            if roll < login_share:
+                await _timed(client, "POST /auth/login", results, "POST", "/auth/login",
+                             json={"email": fixture.users[user_id], "password": BENCH_PASSWORD})
+            elif roll < login_share + (1 - login_share) / 2:
+                await _timed(client, "GET /sessions/inbox", results, "GET", "/sessions/inbox", headers=headers)
+            else:
+                await _timed(client, "GET /sessions/{id}/messages", results, "GET",
+                             f"/sessions/{session_id}/messages", params={"limit": 50}, headers=headers)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*[_loop(client) for _ in range(concurrency)])
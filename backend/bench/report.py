@@ -0,0 +1,99 @@
+# bench/report.py
+from __future__ import annotations
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.db import engine
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def percentiles(values: List[float], scale: float = 1000.0) -> Dict[str, Optional[float]]:
+    """count, mean, p50/p95/p99 and max of `values` (seconds), in ms by default."""
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def _at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale, 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * scale, 3),
+        "p50": _at(0.50),
+        "p95": _at(0.95),
+        "p99": _at(0.99),
+        "max": round(ordered[-1] * scale, 3),
+    }
+
+
+def commit_count() -> Optional[int]:
+    """Committed transactions of the database so far (Postgres statistics)."""
+    if engine.dialect.name != "postgresql":
+        return None
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT xact_commit FROM pg_stat_database WHERE datname = current_database()"
+        )).scalar()
+
+
+class ProcessSampler:
+    """CPU time and peak RSS of server worker processes, read from /proc (Linux)."""
+
+    def __init__(self, pids: List[int], interval: float = 1.0) -> None:
+        self.pids = pids
+        self.interval = interval
+        self.peak_rss: Dict[int, int] = {pid: 0 for pid in pids}
+        self._cpu_start: Dict[int, float] = {}
+        self._started = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._started = time.monotonic()
+        self._cpu_start = {pid: _cpu_seconds(pid) for pid in self.pids}
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Dict[str, dict]:
+        if self._task is not None:
+            self._task.cancel()
+        self._sample()
+        wall = time.monotonic() - self._started
+        out = {}
+        for pid in self.pids:
+            cpu = _cpu_seconds(pid) - self._cpu_start.get(pid, 0.0)
+            out[str(pid)] = {
+                "cpu_percent": round(100 * cpu / wall, 1) if wall > 0 else None,
+                "peak_rss_mb": round(self.peak_rss[pid] / 2 ** 20, 1),
+            }
+        return out
+
+    async def _run(self) -> None:
+        while True:
+            self._sample()
+            await asyncio.sleep(self.interval)
+
+    def _sample(self) -> None:
+        for pid in self.pids:
+            self.peak_rss[pid] = max(self.peak_rss[pid], _rss_bytes(pid))
+
+
+def _cpu_seconds(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _CLK_TCK  # utime + stime
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def _rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except (OSError, IndexError, ValueError):
+        return 0
@@ -0,0 +1,73 @@
+# bench/seed.py
+from __future__ import annotations
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from sqlalchemy import delete, insert
+
+from app import models
+from app.auth.utils import create_access_token, hash_password
+from app.db import SessionLocal
+
+BENCH_DOMAIN = "bench.example.com"
+BENCH_PASSWORD = "bench-password"
+
+
+@dataclass
+class Fixture:
+    """Seeded users and sessions; `members` maps a session to its user ids."""
+    run_id: str
+    users: Dict[uuid.UUID, str] = field(default_factory=dict)    # id -> email
+    tokens: Dict[uuid.UUID, str] = field(default_factory=dict)   # id -> access token
+    members: Dict[uuid.UUID, List[uuid.UUID]] = field(default_factory=dict)
+
+
+def seed(sessions: int, session_size: int, token_minutes: int = 240) -> Fixture:
+    """
+    Insert `sessions` chat sessions with `session_size` members each (the
+    first one owns it), all users fresh. Tokens are minted directly so
+    clients skip the login round trip; /auth/login is driven separately.
+    """
+    fixture = Fixture(run_id=uuid.uuid4().hex[:8])
+    password_hash = hash_password(BENCH_PASSWORD)  # one bcrypt for everyone
+
+    user_rows, session_rows, participant_rows = [], [], []
+    for s in range(sessions):
+        session_id = uuid.uuid4()
+        members = []
+        for m in range(session_size):
+            user_id = uuid.uuid4()
+            email = f"{fixture.run_id}-{s}-{m}@{BENCH_DOMAIN}"
+            user_rows.append({"id": user_id, "email": email, "password_hash": password_hash})
+            fixture.users[user_id] = email
+            fixture.tokens[user_id] = create_access_token(
+                subject=str(user_id), email=email, expires_minutes=token_minutes,
+            )
+            members.append(user_id)
+        session_rows.append({"id": session_id, "user_id": members[0], "title": f"bench {fixture.run_id} #{s}"})
+        participant_rows.extend(
+            {"session_id": session_id, "user_id": user_id, "role": "owner" if i == 0 else "member"}
+            for i, user_id in enumerate(members)
+        )
+        fixture.members[session_id] = members
+
+    with SessionLocal() as db:
+        for model, rows in (
+            (models.User, user_rows),
+            (models.ChatSession, session_rows),
+            (models.ChatSessionParticipant, participant_rows),
+        ):
+            for start in range(0, len(rows), 5000):
+                db.execute(insert(model), rows[start:start + 5000])
+        db.commit()
+    return fixture
+
+
+def cleanup(fixture: Fixture) -> None:
+    """Delete the fixture's users; their sessions, participants and messages cascade."""
+    ids = list(fixture.users)
+    with SessionLocal() as db:
+        for start in range(0, len(ids), 5000):
+            db.execute(delete(models.User).where(models.User.id.in_(ids[start:start + 5000])))
+        db.commit()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# app.config reads these at import; the tests here need no database server
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("WS_BROKER", "memory")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,27 @@
+import asyncio
+import uuid
+
+from app.ws.events import EventCoalescer
+
+
+def test_send_times_expire_without_a_disconnect():
+    sent = []
+
+    async def publish(session_id, frame, key):
+        sent.append(frame["data"])
+
+    async def scenario():
+        coalescer = EventCoalescer(0.01, publish)
+        session_id = uuid.uuid4()
+        # REST read receipts from users with no socket on this worker
+        for seq in range(10):
+            coalescer.submit(session_id, uuid.uuid4(), "read", {"seq": seq})
+        assert len(coalescer._last_sent) == 10
+        await asyncio.sleep(0.05)
+        coalescer.submit(session_id, uuid.uuid4(), "read", {"seq": 10})
+        await asyncio.sleep(0)
+        return coalescer
+
+    coalescer = asyncio.run(scenario())
+    assert len(coalescer._last_sent) == 1
+    assert len(sent) == 11
@@ -0,0 +1,27 @@
+import asyncio
+import time
+
+from app import metrics
+from app.auth.hashing import HasherBusy, PasswordHasher
+
+
+def test_queue_timeouts_do_not_leak_slots():
+    hasher = PasswordHasher(workers=0, concurrency=1, queue_timeout=0.01)
+
+    async def scenario():
+        holder = asyncio.create_task(hasher._run("hash", time.sleep, 0.1))
+        await asyncio.sleep(0)
+        waiters = await asyncio.gather(
+            *[hasher._run("hash", time.sleep, 0) for _ in range(5)], return_exceptions=True,
+        )
+        await holder
+        # every rejected waiter gave its place back: the slot is free again
+        return waiters, await hasher._run("verify", len, "ok")
+
+    waiters, after = asyncio.run(scenario())
+    assert all(isinstance(w, HasherBusy) for w in waiters)
+    assert after == 2
+    assert hasher.stats["rejected"] == 5
+    assert hasher._slots._value == 1
+    assert hasher.waiting == 0 and hasher.in_flight == 0
+    assert 'password_hash_duration_seconds_count{operation="verify"}' in metrics.registry.render()
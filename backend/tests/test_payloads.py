@@ -0,0 +1,22 @@
+import pytest
+from pydantic import ValidationError
+
+from app.crud import payloads
+from app.schemas import MessageCreate
+
+
+def test_client_payload_refs_are_rejected():
+    with pytest.raises(ValidationError):
+        MessageCreate(role="agent", content="x", tool_metadata={"$ref": "sha256:abc"})
+    with pytest.raises(ValueError):
+        payloads.externalize([], {"$ref": "sha256:abc", "size": 1}, {})
+    with pytest.raises(ValueError):
+        payloads.externalize([{"tool": "t", "$ref": "sha256:abc"}], None, {})
+
+
+def test_large_payloads_become_refs():
+    pending = {}
+    calls, metadata = payloads.externalize([{"tool": "t", "out": "x" * 50}], {"k": "v"}, pending, limit=32)
+    assert calls[0]["tool"] == "t" and payloads.is_ref(calls[0])
+    assert metadata == {"k": "v"}
+    assert list(pending) == [payloads._hash_of(calls[0])]
@@ -0,0 +1,16 @@
+import uuid
+
+from app import metrics
+from app.ws.ratelimit import RateLimiter
+
+
+def test_stream_deltas_have_their_own_bucket():
+    limiter = RateLimiter(connection=(1, 2), user=(0, 0), session=(0, 0), stream=(1, 3))
+    frames, deltas = limiter.connection_bucket(), limiter.connection_bucket("stream")
+    user, session = uuid.uuid4(), uuid.uuid4()
+
+    assert [limiter.allow(frames, user, session) for _ in range(3)] == [True, True, False]
+    # the frame bucket is empty; deltas still get their own allowance
+    assert [limiter.allow_stream(deltas) for _ in range(4)] == [True, True, True, False]
+    assert limiter.throttled == {"connection": 1, "user": 0, "session": 0, "stream": 1}
+    assert 'ws_throttled_frames_total{scope="stream"}' in metrics.registry.render()
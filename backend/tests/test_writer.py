@@ -0,0 +1,47 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+from app.ws import writer as writer_module
+from app.ws.writer import FLUSH, MessageWriter
+
+
+class FakeDb:
+    def rollback(self):
+        raise RuntimeError("connection lost")
+
+
+def _row():
+    return {"id": uuid.uuid4(), "session_id": uuid.uuid4(), "content": "hi", "created_at": datetime.now(timezone.utc)}
+
+
+def test_writer_survives_a_failed_batch(monkeypatch):
+    saved = []
+    failures = [RuntimeError("batch insert failed"), RuntimeError("row insert failed")]
+
+    def insert(self, db, items):
+        if failures:
+            raise failures.pop(0)
+        saved.extend(row["id"] for row, _ in items)
+
+    async def run_in_session(fn, *args):
+        return fn(FakeDb(), *args)
+
+    monkeypatch.setattr(MessageWriter, "_insert", insert)
+    monkeypatch.setattr(writer_module, "run_in_session", run_in_session)
+
+    async def scenario():
+        writer = MessageWriter(batch_size=1, flush_interval=0.01, durability=FLUSH, max_pending=10)
+        await writer.start()
+        first, second = _row(), _row()
+        failed = await writer.enqueue(first)
+        # batch insert fails, then the per-row retry's rollback fails too
+        await asyncio.wait_for(asyncio.wait([failed]), 1)
+        assert isinstance(failed.exception(), RuntimeError)
+        await asyncio.wait_for(await writer.enqueue(second), 1)
+        await writer.stop()
+        return first, second, writer.stats
+
+    first, second, stats = asyncio.run(scenario())
+    assert saved == [second["id"]]
+    assert stats["rows"] == 1 and stats["failed_rows"] == 1
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+
+from app import models
+from app.ws import manager as manager_module
+from app.ws.manager import ConnectionManager
+from app.ws.pubsub import InMemoryBroker
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+def _message(session_id, seq):
+    return models.Message(
+        id=uuid.uuid4(),
+        session_id=session_id,
+        seq=seq,
+        user_id=None,
+        role=models.MessageRole.agent,
+        content=f"m{seq}",
+        created_at=datetime.now(timezone.utc),
+    )
+
+
+def _live_frame(session_id, seq):
+    row = manager_module.crud_messages.export_row(_message(session_id, seq))
+    return manager_module.encoding.dumps(manager_module.message_frame(row, None))
+
+
+def test_live_frames_during_replay_query_are_merged_in_seq_order(monkeypatch):
+    async def scenario():
+        manager = ConnectionManager(broker=InMemoryBroker())
+        session_id = uuid.uuid4()
+        ws = FakeWebSocket()
+
+        async def slow_query(fn, sid, since, limit):
+            # messages 9 and 11 are broadcast while the replay query runs
+            await manager._deliver(sid, _live_frame(sid, 11), seq=11)
+            await manager._deliver(sid, _live_frame(sid, 9), seq=9)
+            return [(_message(sid, seq), None) for seq in (8, 9, 10)]
+
+        monkeypatch.setattr(manager_module, "run_in_session", slow_query)
+        await manager.connect(session_id, ws, since=7)
+        for _ in range(20):
+            await asyncio.sleep(0)
+        return ws.sent
+
+    sent = asyncio.run(scenario())
+    messages = [f["seq"] for f in sent if f["type"] == "message"]
+    assert messages == [8, 9, 10, 11]
+    assert sent[-1]["type"] == "replay"
+    assert sent[-1]["last_seq"] == 10
+
+
+def test_release_drops_live_frames_already_seen():
+    async def scenario():
+        ws = FakeWebSocket()
+        conn = manager_module.ClientConnection(
+            ws, on_closed=None, stats={"queued": 0, "sent": 0}, max_queue=100,
+            policy=manager_module.SlowConsumerPolicy.drop_oldest, close_code=1013,
+        )
+        conn.hold()
+        conn.start()
+        conn.enqueue(json.dumps({"type": "presence"}))
+        conn.enqueue(json.dumps({"type": "message", "seq": 5}), seq=5)
+        conn.enqueue(json.dumps({"type": "message", "seq": 7}), seq=7)
+        conn.release([(6, json.dumps({"type": "message", "seq": 6})), (None, json.dumps({"type": "replay"}))], after=5)
+        for _ in range(10):
+            await asyncio.sleep(0)
+        await conn.close()
+        return ws.sent
+
+    sent = asyncio.run(scenario())
+    assert [f["type"] for f in sent] == ["presence", "message", "message", "replay"]
+    assert [f["seq"] for f in sent if f["type"] == "message"] == [6, 7]
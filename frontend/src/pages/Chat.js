@@ -35,6 +35,8 @@ export default function Chat() {
   const [loadingHistory, setLoadingHistory] = useState(true);
   const [connecting, setConnecting] = useState(true);
   const [wsReady, setWsReady] = useState(false);
+  // bumped to reload history, e.g. after a bulk import announced over the socket
+  const [historyVersion, setHistoryVersion] = useState(0);
 
   const wsRef = useRef(null);
   const endRef = useRef(null);
@@ -60,7 +62,7 @@ export default function Chat() {
     return () => {
       cancelled = true;
     };
-  }, [API_URL, sessionId, token, addFlashMessage]);
+  }, [API_URL, sessionId, token, addFlashMessage, historyVersion]);
 
   // Connect WebSocket
   useEffect(() => {
@@ -82,15 +84,57 @@ export default function Chat() {
     ws.onmessage = (evt) => {
       try {
         const data = JSON.parse(evt.data);
+        // A transcript was imported in bulk: fetch it rather than one frame per message
+        if (data.type === "bulk") {
+          setHistoryVersion((v) => v + 1);
+          return;
+        }
+        // Streamed replies: a placeholder grows with each delta until the
+        // saved message (same id) replaces it
+        if (data.type === "stream_start") {
+          setMessages((prev) => [
+            ...prev,
+            {
+              id: data.id,
+              role: data.role || "agent",
+              content: "",
+              user_id: data.user_id || null,
+              username: data.username || null,
+              created_at: new Date().toISOString(),
+              streaming: true,
+            },
+          ]);
+          return;
+        }
+        if (data.type === "stream_delta") {
+          setMessages((prev) =>
+            prev.map((m) =>
+              m.id === data.id ? { ...m, content: m.content.slice(0, data.offset) + data.delta } : m
+            )
+          );
+          return;
+        }
+        if (data.type === "stream_end") {
+          setMessages((prev) => prev.filter((m) => m.id !== data.id));
+          return;
+        }
+        // Only chat messages and errors go into the transcript; presence and
+        // ephemeral events (typing, ...) are not messages
+        if (data.type && data.type !== "message" && data.type !== "error") return;
         const enriched = {
-          id: `live-${Date.now()}-${Math.random().toString(36).slice(2)}`,
+          id: data.id || `live-${Date.now()}-${Math.random().toString(36).slice(2)}`,
+          seq: data.seq,
           role: data.role || "system",
           content: data.content || "",
           user_id: data.user_id || null,
           username: data.username || null,
           created_at: data.created_at || new Date().toISOString(),
         };
-        setMessages((prev) => [...prev, enriched]);
+        setMessages((prev) =>
+          data.id && prev.some((m) => m.id === data.id)
+            ? prev.map((m) => (m.id === data.id ? enriched : m))
+            : [...prev, enriched]
+        );
       } catch {
         // ignore malformed
       }
@@ -117,6 +161,17 @@ export default function Chat() {
     endRef.current?.scrollIntoView({ behavior: "smooth" });
   }, [messages]);
 
+  // Read receipts: report the newest message shown (the server coalesces these)
+  const lastReadRef = useRef(0);
+  useEffect(() => {
+    const newest = messages.reduce((max, m) => (m.seq > max ? m.seq : max), 0);
+    const ws = wsRef.current;
+    if (newest > lastReadRef.current && wsReady && ws && ws.readyState === WebSocket.OPEN) {
+      lastReadRef.current = newest;
+      ws.send(JSON.stringify({ type: "read", seq: newest }));
+    }
+  }, [messages, wsReady]);
+
   const sendMessage = () => {
     const text = input.trim();
     if (!text || !wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) return;
@@ -40,7 +40,7 @@ const Sessions = () => {
   const fetchSessions = async () => {
     try {
       setLoading(true);
-      const res = await axios.get(`${API_URL}/sessions`, {
+      const res = await axios.get(`${API_URL}/sessions/inbox`, {
         headers: { Authorization: `Bearer ${token}` },
       });
       setSessions(res.data);
@@ -189,6 +189,19 @@ const Sessions = () => {
                               ? dayjs(s.created_at).format("MMM D, YYYY h:mm A")
                               : "Unknown date"}
                           </p>
+                          {s.last_message_preview && (
+                            <p className="small mb-2 text-truncate">
+                              {s.last_message_preview}
+                              <span className="text-muted">
+                                {" "}
+                                · {dayjs(s.last_message_at).format("MMM D, h:mm A")}
+                                {" "}· {s.message_count} messages
+                              </span>
+                              {s.unread_count > 0 && (
+                                <strong className="text-primary"> · {s.unread_count} unread</strong>
+                              )}
+                            </p>
+                          )}
 
                           {inviteLinks[s.id] && (
                             <div className="invite-link mt-2">